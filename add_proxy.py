@@ -1,9 +1,13 @@
 #!/usr/bin/env python3
 """Скрипт для добавления прокси"""
 
+import os
 import psycopg2
+import redis
 import sys
 
+from proxy_changes import publish_proxy_changes
+
 def add_proxy(proxy_type, ip, port, country="US", city="", max_users=10, proxy_username="", proxy_password=""):
     conn = psycopg2.connect(
         dbname="proxyflow",
@@ -18,12 +22,17 @@ def add_proxy(proxy_type, ip, port, country="US", city="", max_users=10, proxy_u
     cur.execute("""
         INSERT INTO proxy_pools (proxy_type, ip_address, port, country, city, is_active, success_rate, max_users, current_users, proxy_username, proxy_password)
         VALUES (%s, %s, %s, %s, %s, true, 100.0, %s, 0, %s, %s)
+        RETURNING id
     """, (proxy_type, ip, port, country, city, max_users, proxy_username, proxy_password))
+    proxy_id = cur.fetchone()[0]
 
     conn.commit()
     cur.close()
     conn.close()
 
+    # Сообщаем воркерам FastAPI о новом прокси (индекс пула в памяти)
+    publish_proxy_changes(redis.Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0")), proxy_id)
+
     auth_info = f" (auth: {proxy_username})" if proxy_username else " (no auth)"
     print(f"✅ Прокси добавлен: {ip}:{port} ({proxy_type}, max_users={max_users}){auth_info}")
 
@@ -0,0 +1,229 @@
+"""
+API request events for ClickHouse (api_events in clickhouse_schema.sql).
+
+    proxy_issued     one row per proxy handed out by /proxy/get
+    proxy_allocated  one row per proxy allocated by /proxy/allocate
+    auth_failed      one row per 401 answered by any endpoint (user_id 0)
+
+record() only appends to per-column Python lists. A background task flushes
+them once ANALYTICS_FLUSH_MAX_EVENTS rows are buffered or every
+ANALYTICS_FLUSH_INTERVAL_SECONDS, as a single native-protocol INSERT with
+columnar=True, so the driver serializes each column in one go instead of
+walking rows.
+
+If the INSERT fails the batch is written to ANALYTICS_SPILL_DIR (one gzipped
+JSON file of columns per batch, capped at ANALYTICS_SPILL_MAX_BYTES) and
+replayed oldest first after the next successful flush. Workers may share the
+directory: a file is claimed by renaming it before replay. Beyond the spill cap,
+or ANALYTICS_BUFFER_MAX_EVENTS rows in memory, events are dropped and counted.
+"""
+import asyncio
+import gzip
+import json
+import logging
+import os
+import time
+from contextlib import suppress
+from typing import Callable, Dict, List, Optional
+
+from clickhouse_driver.errors import Error as ClickHouseError
+
+from stats_service import new_client
+
+ANALYTICS_ENABLED = os.getenv("ANALYTICS_ENABLED", "1") == "1"
+ANALYTICS_FLUSH_MAX_EVENTS = int(os.getenv("ANALYTICS_FLUSH_MAX_EVENTS", "10000"))
+ANALYTICS_FLUSH_INTERVAL_SECONDS = float(os.getenv("ANALYTICS_FLUSH_INTERVAL_SECONDS", "5"))
+ANALYTICS_BUFFER_MAX_EVENTS = int(os.getenv("ANALYTICS_BUFFER_MAX_EVENTS", "1000000"))
+ANALYTICS_INSERT_TIMEOUT_SECONDS = float(os.getenv("ANALYTICS_INSERT_TIMEOUT_SECONDS", "30"))
+ANALYTICS_SPILL_DIR = os.getenv("ANALYTICS_SPILL_DIR", "/tmp/proxyflow-analytics")
+ANALYTICS_SPILL_MAX_BYTES = int(os.getenv("ANALYTICS_SPILL_MAX_BYTES", str(1024 ** 3)))
+# Spill files replayed per flush, so catching up never delays fresh batches for long
+ANALYTICS_SPILL_REPLAY_FILES = int(os.getenv("ANALYTICS_SPILL_REPLAY_FILES", "10"))
+# A claimed file whose worker died is released after this long
+ANALYTICS_SPILL_CLAIM_SECONDS = float(os.getenv("ANALYTICS_SPILL_CLAIM_SECONDS", "600"))
+
+API_EVENT_COLUMNS = (
+    "event_time",  # DateTime64(3), as integer milliseconds
+    "event_type",
+    "user_id",
+    "proxy_id",
+    "proxy_type",
+    "country",
+    "endpoint",
+    "client_ip",
+)
+INSERT_API_EVENTS = f"INSERT INTO api_events ({', '.join(API_EVENT_COLUMNS)}) VALUES"
+INSERT_ERRORS = (ClickHouseError, OSError, EOFError)
+
+Columns = Dict[str, list]
+
+logger = logging.getLogger("proxyflow")
+
+
+def _empty_columns() -> Columns:
+    return {name: [] for name in API_EVENT_COLUMNS}
+
+
+class SpillDirectory:
+    """Failed batches on local disk until ClickHouse takes them"""
+
+    SUFFIX = ".json.gz"
+    CLAIM = ".claimed"
+
+    def __init__(self, path: str = ANALYTICS_SPILL_DIR, max_bytes: int = ANALYTICS_SPILL_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+
+    def _entries(self) -> List[os.DirEntry]:
+        try:
+            return list(os.scandir(self.path))
+        except FileNotFoundError:
+            return []
+
+    def write(self, columns: Columns) -> bool:
+        """False when the directory is full or unwritable; the batch is lost"""
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            used = sum(entry.stat().st_size for entry in self._entries())
+            if used >= self.max_bytes:
+                logger.error("Analytics spill dir %s is full (%d bytes)", self.path, used)
+                return False
+            # time_ns first so sorting by name replays oldest first
+            name = os.path.join(self.path, f"api_events-{time.time_ns()}-{os.getpid()}{self.SUFFIX}")
+            with gzip.open(name + ".tmp", "wt", compresslevel=1) as f:
+                json.dump(columns, f, separators=(",", ":"))
+            os.replace(name + ".tmp", name)
+            return True
+        except OSError as e:
+            logger.error("Analytics spill to %s failed: %s", self.path, e)
+            return False
+
+    def pending(self) -> List[str]:
+        names = []
+        stale_before = time.time() - ANALYTICS_SPILL_CLAIM_SECONDS
+        for entry in self._entries():
+            if entry.name.endswith(self.SUFFIX):
+                names.append(entry.path)
+            elif self.CLAIM in entry.name:
+                with suppress(OSError):
+                    if entry.stat().st_mtime < stale_before:
+                        os.rename(entry.path, entry.path.split(self.CLAIM)[0])
+        return sorted(names)
+
+    def replay(self, insert: Callable[[Columns], None], limit: int = ANALYTICS_SPILL_REPLAY_FILES) -> int:
+        """Insert up to limit spilled batches; insert errors propagate and leave the file in place"""
+        replayed = 0
+        for path in self.pending()[:limit]:
+            claimed = f"{path}{self.CLAIM}-{os.getpid()}"
+            try:
+                os.rename(path, claimed)  # atomic: only one worker gets the file
+                os.utime(claimed)
+            except FileNotFoundError:
+                continue
+            try:
+                with gzip.open(claimed, "rt") as f:
+                    columns = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.error("Dropping unreadable analytics spill file %s: %s", claimed, e)
+                os.remove(claimed)
+                continue
+            try:
+                insert(columns)
+            except BaseException:
+                os.rename(claimed, path)
+                raise
+            os.remove(claimed)
+            replayed += len(columns["event_time"])
+        return replayed
+
+
+class AnalyticsBuffer:
+    def __init__(self, client_factory: Optional[Callable] = None, spill: Optional[SpillDirectory] = None,
+                 max_events: int = ANALYTICS_FLUSH_MAX_EVENTS, interval: float = ANALYTICS_FLUSH_INTERVAL_SECONDS):
+        self.client_factory = client_factory or (lambda: new_client(send_receive_timeout=ANALYTICS_INSERT_TIMEOUT_SECONDS))
+        self.spill = spill or SpillDirectory()
+        self.max_events = max_events
+        self.interval = interval
+        self.columns = _empty_columns()
+        self.dropped = 0
+        self._client = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self):
+        return len(self.columns["event_time"])
+
+    def record(self, event_type: str, user_id: int = 0, proxy_id: int = 0, proxy_type: str = "",
+               country: str = "", endpoint: str = "", client_ip: str = ""):
+        if len(self) >= ANALYTICS_BUFFER_MAX_EVENTS:
+            self.dropped += 1
+            return
+        c = self.columns
+        c["event_time"].append(int(time.time() * 1000))
+        c["event_type"].append(event_type)
+        c["user_id"].append(user_id)
+        c["proxy_id"].append(proxy_id)
+        c["proxy_type"].append(proxy_type)
+        c["country"].append(country)
+        c["endpoint"].append(endpoint)
+        c["client_ip"].append(client_ip)
+        if len(self) >= self.max_events:
+            self._wakeup.set()
+
+    def _insert(self, columns: Columns):
+        if self._client is None:
+            self._client = self.client_factory()
+        try:
+            self._client.execute(INSERT_API_EVENTS, [columns[name] for name in API_EVENT_COLUMNS],
+                                 columnar=True, types_check=False)
+        except INSERT_ERRORS:
+            with suppress(Exception):
+                self._client.disconnect()
+            self._client = None
+            raise
+
+    def write(self, columns: Optional[Columns]) -> int:
+        """Insert a batch (None: only catch up on spilled ones); returns rows dropped. Worker thread"""
+        if columns:
+            try:
+                self._insert(columns)
+            except INSERT_ERRORS as e:
+                logger.warning("Analytics insert failed, spilling batch to %s: %s", self.spill.path, e)
+                return 0 if self.spill.write(columns) else len(columns["event_time"])
+        try:
+            self.spill.replay(self._insert)
+        except INSERT_ERRORS as e:
+            logger.warning("Analytics spill replay failed: %s", e)
+        return 0
+
+    async def flush(self):
+        if len(self):
+            batch, self.columns = self.columns, _empty_columns()
+            self.dropped += await asyncio.to_thread(self.write, batch)
+        elif self.spill.pending():
+            await asyncio.to_thread(self.write, None)
+        if self.dropped:
+            logger.error("Dropped %d analytics events", self.dropped)
+            self.dropped = 0
+
+    async def _run(self):
+        while True:
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Analytics flush failed")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        await self.flush()
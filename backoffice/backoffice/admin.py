@@ -1,7 +1,32 @@
+import csv
+
 from django.contrib import admin
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from django.utils.html import format_html
+from .changelist import AutocompleteFilter, KeysetPaginationMixin
 from .models import User, Subscription, ProxyPool, UsageLog, UserAllocatedProxy
 
+# Same columns as FastAPI's /user/usage/export (main.py USAGE_EXPORT_COLUMNS), plus the user
+USAGE_EXPORT_COLUMNS = (
+    'user_id', 'user_email',
+    'timestamp', 'proxy_id', 'proxy_ip', 'proxy_port', 'proxy_type', 'proxy_country',
+    'success', 'request_count', 'data_used_mb',
+)
+USAGE_EXPORT_CHUNK_ROWS = 10000
+
+
+class Echo:
+    """csv.writer target that hands each encoded row back instead of buffering it"""
+    def write(self, value):
+        return value
+
+
+def _proxy_field(name):
+    return Subquery(ProxyPool.objects.filter(pk=OuterRef('proxy_id')).values(name)[:1])
+
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
@@ -33,7 +58,7 @@ class UserAdmin(admin.ModelAdmin):
 
 @admin.register(ProxyPool)
 class ProxyPoolAdmin(admin.ModelAdmin):
-    list_display = ['proxy_type', 'ip_port', 'country', 'city', 'usage_display', 'is_active', 'success_rate', 'last_used']
+    list_display = ['proxy_type', 'ip_port', 'country', 'city', 'usage_display', 'is_active', 'success_rate', 'latency_ms', 'last_used']
     list_filter = ['proxy_type', 'is_active', 'country']
     search_fields = ['ip_address', 'country', 'city']
     readonly_fields = ['last_used', 'current_users']
@@ -72,9 +97,13 @@ class SubscriptionAdmin(admin.ModelAdmin):
         'is_active', 'expires_at'
     ]
     list_filter = ['plan', 'is_active', 'created_at']
+    list_select_related = ['user']
+    autocomplete_fields = ['user']
     search_fields = ['user__username', 'user__email']
-    readonly_fields = ['created_at', 'proxy_usage_percent_display', 'remaining_proxies']
+    # data_used_gb is checkpointed from the live Redis counter; use the reset action instead
+    readonly_fields = ['created_at', 'proxy_usage_percent_display', 'remaining_proxies', 'data_used_gb']
     ordering = ['-created_at']
+    actions = ['reset_data_usage']
     
     fieldsets = (
         ('Subscription Info', {
@@ -89,10 +118,9 @@ class SubscriptionAdmin(admin.ModelAdmin):
             ),
             'description': 'Shared proxies - multiple users can use same proxy'
         }),
-        ('Data Limits (Future Gateway)', {
+        ('Data Limits', {
             'fields': ('data_limit_gb', 'data_used_gb'),
-            'classes': ('collapse',),
-            'description': 'Will be used when Proxy Gateway is implemented'
+            'description': 'Gateway traffic is counted in Redis; data used is written back every few seconds'
         }),
         ('Connection Limits', {
             'fields': ('concurrent_connections',)
@@ -116,14 +144,27 @@ class SubscriptionAdmin(admin.ModelAdmin):
         return obj.remaining_proxies
     remaining_proxies.short_description = 'Remaining'
 
+    def reset_data_usage(self, request, queryset):
+        for subscription in queryset:
+            subscription.data_used_gb = 0.0
+            subscription._quota_mode = 'set'
+            subscription.save(update_fields=['data_used_gb'])
+        self.message_user(request, f'Data usage reset for {len(queryset)} subscriptions')
+    reset_data_usage.short_description = 'Reset data usage'
+
 
 @admin.register(UsageLog)
-class UsageLogAdmin(admin.ModelAdmin):
+class UsageLogAdmin(KeysetPaginationMixin, admin.ModelAdmin):
     list_display = ['user', 'proxy_id', 'request_count', 'data_used_mb', 'success', 'timestamp']
-    list_filter = ['success', 'timestamp']
-    search_fields = ['user__username', 'user__email']
+    list_filter = [('user', AutocompleteFilter), 'success', 'timestamp']
+    list_select_related = ['user']
+    autocomplete_fields = ['user']
+    # Exact matches resolve to one user and use the (user_id, timestamp) index;
+    # icontains would scan every row
+    search_fields = ['=user__username', '=user__email']
     readonly_fields = ['timestamp']
-    ordering = ['-timestamp']
+    keyset_field = 'timestamp'
+    actions = ['export_usage_csv']
     
     fieldsets = (
         ('Usage Information', {
@@ -134,14 +175,46 @@ class UsageLogAdmin(admin.ModelAdmin):
         }),
     )
 
+    def export_usage_csv(self, request, queryset):
+        # Narrow the range with the timestamp filter, then "select all".
+        # iterator() reads through a server-side cursor, so the export streams
+        # in constant memory however many rows match.
+        rows = queryset.order_by('timestamp', 'id').annotate(
+            proxy_ip=_proxy_field('ip_address'),
+            proxy_port=_proxy_field('port'),
+            proxy_type_label=_proxy_field('proxy_type'),
+            proxy_country=_proxy_field('country'),
+        ).values_list(
+            'user_id', 'user__email',
+            'timestamp', 'proxy_id', 'proxy_ip', 'proxy_port', 'proxy_type_label', 'proxy_country',
+            'success', 'request_count', 'data_used_mb',
+        ).iterator(chunk_size=USAGE_EXPORT_CHUNK_ROWS)
+
+        writer = csv.writer(Echo())
+
+        def lines():
+            yield writer.writerow(USAGE_EXPORT_COLUMNS)
+            # One transaction around the cursor, so it also works behind PgBouncer's transaction pooling
+            with transaction.atomic():
+                for row in rows:
+                    yield writer.writerow(row[:2] + (row[2].isoformat(),) + row[3:])
+
+        response = StreamingHttpResponse(lines(), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="usage-{timezone.now():%Y%m%d-%H%M}.csv"'
+        return response
+    export_usage_csv.short_description = 'Export selected usage as CSV'
+
 
 @admin.register(UserAllocatedProxy)
-class UserAllocatedProxyAdmin(admin.ModelAdmin):
+class UserAllocatedProxyAdmin(KeysetPaginationMixin, admin.ModelAdmin):
     list_display = ['user', 'proxy_pool', 'gateway_port', 'allocated_at']
-    list_filter = ['allocated_at', 'user']
-    search_fields = ['user__username', 'user__email', 'gateway_port']
+    list_filter = [('user', AutocompleteFilter), 'allocated_at']
+    list_select_related = ['user', 'proxy_pool']
+    autocomplete_fields = ['user', 'proxy_pool']
+    search_fields = ['=user__username', '=user__email', '=gateway_port']
     readonly_fields = ['allocated_at']
-    ordering = ['-allocated_at']
+    # ids grow with allocated_at, and the primary key index serves the pages
+    keyset_field = 'pk'
     
     fieldsets = (
         ('Allocation Info', {
@@ -0,0 +1,191 @@
+"""
+Redis state shared with the FastAPI service (see main.py "Auth cache",
+"Proxy pool index", "Gateway allocation map" and "Data quota"). Key names must
+stay in sync with main.py.
+"""
+import hashlib
+import logging
+import secrets
+
+import redis
+from django.conf import settings
+
+from .models import UserAllocatedProxy
+
+logger = logging.getLogger(__name__)
+
+redis_client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+
+# Mirror of proxy_changes.py in the repo root, which Django can't import
+PROXY_CHANGES_STREAM = 'proxy_pool:changes'
+PROXY_CHANGES_MAXLEN = 10000
+
+
+def user_cache_key(user_id):
+    return f"cache:user:{user_id}"
+
+
+def api_key_cache_key(api_key):
+    return f"cache:apikey:{api_key}"
+
+
+def subscription_cache_key(user_id):
+    return f"cache:subscription:{user_id}"
+
+
+def alloc_version_key(user_id):
+    return f"alloc:version:{user_id}"
+
+
+def gateway_alloc_key(username, gateway_port):
+    return f"gateway:alloc:{username}_{gateway_port}"
+
+
+def gateway_user_allocs_key(user_id):
+    return f"gateway:user_allocs:{user_id}"
+
+
+def gateway_alloc_lock_key(user_id):
+    return f"gateway:user_allocs:{user_id}:lock"
+
+
+def invalidate_user_cache(user_id, *api_keys):
+    """Drop cached User/Subscription rows for user_id (and any given API keys)"""
+    keys = [user_cache_key(user_id), subscription_cache_key(user_id)]
+    keys.extend(api_key_cache_key(key) for key in api_keys if key)
+    try:
+        redis_client.delete(*keys)
+    except redis.RedisError as e:
+        # Entries still expire by TTL; never fail an admin save over the cache
+        logger.warning("Auth cache invalidation failed: %s", e)
+
+
+def publish_proxy_changes(*proxy_ids):
+    """Tell FastAPI workers to reload these proxy_pools rows ("*" = reload everything)"""
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for proxy_id in proxy_ids:
+            pipe.xadd(PROXY_CHANGES_STREAM, {'id': str(proxy_id)},
+                      maxlen=PROXY_CHANGES_MAXLEN, approximate=True)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning("Proxy change feed publish failed: %s", e)
+
+
+def bump_alloc_versions(*user_ids):
+    """Invalidate /proxy/list ETags for these users"""
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.set(alloc_version_key(user_id), secrets.token_hex(8))
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning("Allocation version bump failed: %s", e)
+
+
+# Gateway allocation map (main.py "Gateway allocation map"): same script, keys and fields
+GATEWAY_ALLOC_LOCK_SECONDS = 10
+
+REPLACE_GATEWAY_ALLOCATIONS_LUA = """
+for _, key in ipairs(redis.call('SMEMBERS', KEYS[1])) do
+    redis.call('DEL', key)
+end
+redis.call('DEL', KEYS[1])
+local i = 1
+while i <= #ARGV do
+    local n = tonumber(ARGV[i + 1])
+    redis.call('HSET', ARGV[i], unpack(ARGV, i + 2, i + 1 + n))
+    redis.call('SADD', KEYS[1], ARGV[i])
+    i = i + 2 + n
+end
+return redis.call('SCARD', KEYS[1])
+"""
+replace_gateway_allocations = redis_client.register_script(REPLACE_GATEWAY_ALLOCATIONS_LUA)
+
+
+def gateway_allocation_args(user_ids):
+    """{user_id: script arguments} for the current allocations of active users among user_ids"""
+    args = {user_id: [] for user_id in user_ids}
+    rows = UserAllocatedProxy.objects.filter(user_id__in=user_ids, user__is_active=True).values_list(
+        'user_id', 'user__username', 'user__api_key', 'gateway_port', 'proxy_pool_id',
+        'proxy_pool__ip_address', 'proxy_pool__port', 'proxy_pool__proxy_username',
+        'proxy_pool__proxy_password', 'proxy_pool__proxy_type', 'proxy_pool__country',
+    )
+    for (user_id, username, api_key, gateway_port, proxy_pool_id,
+         host, port, proxy_username, proxy_password, proxy_type, country) in rows:
+        fields = {
+            'user_id': user_id,
+            'proxy_pool_id': proxy_pool_id,
+            'gateway_port': gateway_port,
+            'host': host,
+            'port': port,
+            'proxy_username': proxy_username or '',
+            'proxy_password': proxy_password or '',
+            'proxy_type': proxy_type,
+            'country': country or '',
+            'api_key_sha256': hashlib.sha256((api_key or '').encode('utf-8')).hexdigest(),
+        }
+        entry = args[user_id]
+        entry += [gateway_alloc_key(username, gateway_port), len(fields) * 2]
+        for name, value in fields.items():
+            entry += [name, value]
+    return args
+
+
+def publish_gateway_allocations(*user_ids):
+    """Republish these users' gateway entries from the database; call on commit"""
+    for user_id in set(user_ids):
+        try:
+            with redis_client.lock(gateway_alloc_lock_key(user_id), timeout=GATEWAY_ALLOC_LOCK_SECONDS,
+                                   blocking_timeout=GATEWAY_ALLOC_LOCK_SECONDS):
+                args = gateway_allocation_args([user_id])[user_id]
+                replace_gateway_allocations(keys=[gateway_user_allocs_key(user_id)], args=args)
+        except redis.RedisError as e:
+            # rebuild_gateway_allocations repairs the map; never fail an admin save over it
+            logger.warning("Gateway allocation publish failed for user %s: %s", user_id, e)
+
+
+# Data quota (main.py "Data quota"): same script, keys and channel
+QUOTA_KEYS = ['quota:used', 'quota:limit', 'quota:exhausted_users', 'quota:dirty']
+QUOTA_EXHAUSTED_CHANNEL = 'quota:exhausted'
+BYTES_PER_GB = 1024 ** 3
+
+SYNC_QUOTA_LUA = """
+local user = ARGV[2]
+if ARGV[3] == '' then
+    redis.call('HDEL', KEYS[1], user)
+    redis.call('HDEL', KEYS[2], user)
+    redis.call('SREM', KEYS[3], user)
+    return 0
+end
+redis.call('HSET', KEYS[2], user, ARGV[3])
+if ARGV[5] == 'set' then
+    redis.call('HSET', KEYS[1], user, ARGV[4])
+elseif ARGV[5] == 'seed' then
+    redis.call('HSETNX', KEYS[1], user, ARGV[4])
+end
+local used = tonumber(redis.call('HGET', KEYS[1], user) or '0')
+if used >= tonumber(ARGV[3]) then
+    if redis.call('SADD', KEYS[3], user) == 1 then
+        redis.call('PUBLISH', ARGV[1], user)
+    end
+    return 1
+end
+redis.call('SREM', KEYS[3], user)
+return 0
+"""
+sync_quota_script = redis_client.register_script(SYNC_QUOTA_LUA)
+
+
+def sync_quota(user_id, limit_gb, used_gb=0.0, mode='keep'):
+    """Push a subscription's data limit to the quota counters (limit_gb=None drops them).
+    mode: 'seed' sets the used counter if missing, 'set' overwrites it, 'keep' leaves it."""
+    limit = '' if limit_gb is None else round(limit_gb * BYTES_PER_GB)
+    try:
+        sync_quota_script(
+            keys=QUOTA_KEYS,
+            args=[QUOTA_EXHAUSTED_CHANNEL, user_id, limit, round((used_gb or 0.0) * BYTES_PER_GB), mode],
+        )
+    except redis.RedisError as e:
+        # FastAPI seeds limits from subscriptions on startup
+        logger.warning("Quota sync failed for user %s: %s", user_id, e)
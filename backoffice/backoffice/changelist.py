@@ -0,0 +1,201 @@
+"""
+Admin changelists that stay fast on tables with millions of rows
+(usage_logs, user_allocated_proxies).
+
+The stock changelist runs COUNT(*) over the filtered table for the paginator,
+another one for the "N total" figure, and OFFSET pages whose cost grows with
+the page number. Here instead:
+
+- EstimatedCountPaginator takes the count from pg_class.reltuples (no
+  filters) or from the planner's row estimate (filters), and only counts
+  exactly when the estimate is small.
+- KeysetChangeList pages newest first by (keyset_field, pk) with
+  ?after=/?before= cursors, so every page is an index range scan of
+  list_per_page + 1 rows however deep it is.
+- AutocompleteFilter filters by a foreign key through the admin's select2
+  autocomplete, instead of a sidebar listing every related object.
+"""
+import json
+
+from django import forms
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+
+AFTER_VAR = 'after'
+BEFORE_VAR = 'before'
+# Below this many rows (estimated) an exact COUNT(*) is cheap enough
+EXACT_COUNT_THRESHOLD = 10000
+
+
+def estimated_count(queryset):
+    """Planner estimate of the rows in queryset, None off Postgres"""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            # Partitioned tables keep their statistics on the partitions
+            table = queryset.model._meta.db_table
+            cursor.execute("""
+                SELECT COALESCE(SUM(GREATEST(c.reltuples, 0)), 0)::bigint
+                FROM pg_class c
+                WHERE c.oid = %s::regclass
+                   OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass)
+            """, [table, table])
+            return cursor.fetchone()[0]
+        sql, params = queryset.order_by().query.sql_with_params()
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate is None or estimate < EXACT_COUNT_THRESHOLD:
+            return self.object_list.count()
+        return estimate
+
+
+class KeysetChangeList(ChangeList):
+    """
+    Newest-first pages of (keyset_field, pk) < cursor, instead of OFFSET.
+    Column sorting and "Show all" are off; list_editable isn't supported.
+    """
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(AFTER_VAR, None)
+        lookup_params.pop(BEFORE_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Filter, search and page links start from the newest row unless they set a cursor
+        return super().get_query_string({AFTER_VAR: None, BEFORE_VAR: None, **(new_params or {})}, remove)
+
+    def get_ordering(self, request, queryset):
+        field = self.model_admin.keyset_field
+        return [f'-{field}'] if field == 'pk' else [f'-{field}', '-pk']
+
+    def cursor(self, obj):
+        field = self.model_admin.keyset_field
+        if field == 'pk':
+            return str(obj.pk)
+        return f'{getattr(obj, field).isoformat()}_{obj.pk}'
+
+    def parse_cursor(self, value):
+        field = self.model_admin.keyset_field
+        try:
+            if field == 'pk':
+                return None, self.opts.pk.to_python(value)
+            key, _sep, pk = value.rpartition('_')
+            return self.opts.get_field(field).to_python(key), self.opts.pk.to_python(pk)
+        except ValidationError as e:
+            raise IncorrectLookupParameters(e)
+
+    def seek(self, queryset, value, pk, older):
+        field = self.model_admin.keyset_field
+        op = 'lt' if older else 'gt'
+        if field == 'pk':
+            return queryset.filter(**{f'pk__{op}': pk})
+        # The first filter bounds the index scan on keyset_field; the Q picks the exact position
+        return queryset.filter(**{f'{field}__{op}e': value}).filter(
+            Q(**{f'{field}__{op}': value}) | Q(**{field: value, f'pk__{op}': pk})
+        )
+
+    def get_results(self, request):
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        n = self.list_per_page
+        after = request.GET.get(AFTER_VAR)
+        before = request.GET.get(BEFORE_VAR)
+
+        if before:
+            value, pk = self.parse_cursor(before)
+            ascending = [o[1:] for o in self.get_ordering(request, self.queryset)]
+            rows = list(self.seek(self.queryset, value, pk, older=False).order_by(*ascending)[:n + 1])
+            has_newer, has_older = len(rows) > n, True
+            rows = rows[:n][::-1]
+        else:
+            queryset = self.queryset
+            if after:
+                value, pk = self.parse_cursor(after)
+                queryset = self.seek(queryset, value, pk, older=True)
+            rows = list(queryset[:n + 1])
+            has_newer, has_older = bool(after), len(rows) > n
+            rows = rows[:n]
+
+        self.result_count = paginator.count
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.result_list = rows
+        self.can_show_all = False
+        self.multi_page = has_newer or has_older
+        self.paginator = paginator
+        self.first_page_url = self.get_query_string() if has_newer else None
+        self.newer_page_url = self.get_query_string({BEFORE_VAR: self.cursor(rows[0])}) if has_newer and rows else None
+        self.older_page_url = self.get_query_string({AFTER_VAR: self.cursor(rows[-1])}) if has_older and rows else None
+
+
+class AutocompleteFilter(admin.FieldListFilter):
+    """
+    list_filter = [('user', AutocompleteFilter)]: a select2 box searching the
+    related ModelAdmin's search_fields. Same query parameter as Django's
+    RelatedFieldListFilter, so existing links keep working.
+    """
+    template = 'admin/backoffice/autocomplete_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg = f'{field_path}__{field.target_field.name}__exact'
+        self.lookup_val = params.get(self.lookup_kwarg)
+        super().__init__(field, request, params, model, model_admin, field_path)
+        remote_model = field.remote_field.model
+        form_field = forms.ModelChoiceField(
+            queryset=remote_model._default_manager.all(),
+            widget=AutocompleteSelect(field, model_admin.admin_site),
+            required=False,
+        )
+        self.rendered_widget = form_field.widget.render(
+            self.lookup_kwarg, self.lookup_val, attrs={'id': f'filter_{self.lookup_kwarg}'},
+        )
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    def choices(self, changelist):
+        yield {
+            'selected': self.lookup_val is None,
+            'query_string': changelist.get_query_string(remove=[self.lookup_kwarg]),
+            'display': _('All'),
+            # Carried through the filter's GET form
+            'hidden_params': [
+                (k, v) for k, v in changelist.get_filters_params().items() if k != self.lookup_kwarg
+            ] + [('q', changelist.query)] * bool(changelist.query),
+        }
+
+
+class KeysetPaginationMixin:
+    """ModelAdmin mixin: estimated counts, keyset pages and autocomplete filter assets"""
+    keyset_field = 'pk'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    sortable_by = ()
+    change_list_template = 'admin/backoffice/keyset_change_list.html'
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    @property
+    def media(self):
+        return super().media + AutocompleteSelect(None, self.admin_site).media
@@ -0,0 +1,185 @@
+"""
+Monthly partitions of usage_logs (see migration 0010_partition_usage_logs).
+
+Creates the partitions for the current month and --months-ahead months after
+it (months an existing partition covers, such as usage_logs_legacy, are
+skipped), and drops every partition that ended more than --retention-days ago
+(90 by default, the same as the ClickHouse request_logs TTL). With --detach,
+expired partitions are only detached and stay behind as standalone tables for
+archiving. Dropping a partition is instant and leaves no bloat, unlike
+DELETE. usage_daily_rollups keeps the aggregates, so /user/stats is
+unaffected.
+
+Rows that landed in usage_logs_default because their month had no partition
+yet are moved into the new partition when it is created. Expired rows of
+partitions that can't be dropped whole, usage_logs_default and the
+open-ended usage_logs_legacy, are deleted in --delete-batch-size batches.
+Each change waits at most LOCK_TIMEOUT for its lock and is otherwise retried
+on the next run.
+
+    python manage.py manage_usage_partitions
+    python manage.py manage_usage_partitions --months-ahead 6 --retention-days 180 --detach --dry-run
+"""
+import os
+import re
+from datetime import datetime, timedelta, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, transaction
+
+PARENT = 'usage_logs'
+DEFAULT_PARTITION = 'usage_logs_default'
+LEGACY_PARTITION = 'usage_logs_legacy'
+BOUND_RE = re.compile(r"FOR VALUES FROM \((.+?)\) TO \((.+?)\)")
+LOCK_TIMEOUT = '5s'
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+
+def next_month(value):
+    if value.month == 12:
+        return value.replace(year=value.year + 1, month=1)
+    return value.replace(month=value.month + 1)
+
+
+def partition_name(start):
+    return f'usage_logs_p{start:%Y%m}'
+
+
+def parse_bound(value):
+    """A range bound as datetime; None for MINVALUE / MAXVALUE"""
+    value = value.strip()
+    if not value.startswith("'"):
+        return None
+    return datetime.fromisoformat(value.strip("'"))
+
+
+class Command(BaseCommand):
+    help = 'Create upcoming monthly usage_logs partitions and drop or detach expired ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=3)
+        parser.add_argument(
+            '--retention-days', type=int, default=int(os.environ.get('USAGE_LOGS_RETENTION_DAYS', '90')),
+            help='drop partitions that ended this many days ago; 0 keeps everything',
+        )
+        parser.add_argument('--detach', action='store_true', help='detach expired partitions instead of dropping them')
+        parser.add_argument('--delete-batch-size', type=int, default=10000,
+                            help='rows per DELETE when expiring rows of the default and legacy partitions')
+        parser.add_argument('--dry-run', action='store_true', help='print the statements without running them')
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [PARENT])
+            row = cursor.fetchone()
+        if not row or row[0] != 'p':
+            raise CommandError(f'{PARENT} is not a partitioned table; run migrations first')
+
+        existing = self.partitions()
+        now = datetime.now(timezone.utc)
+
+        start = month_start(now)
+        for _ in range(options['months_ahead'] + 1):
+            end = next_month(start)
+            if not self.covered(existing, start, end):
+                self.create_partition(start, end)
+            start = end
+
+        if options['retention_days'] > 0:
+            cutoff = now - timedelta(days=options['retention_days'])
+            for name, (_lower, upper) in sorted(existing.items()):
+                if upper is not None and upper <= cutoff:
+                    self.expire_partition(name, options['detach'])
+                elif name in (DEFAULT_PARTITION, LEGACY_PARTITION):
+                    self.expire_rows(name, cutoff, options['delete_batch_size'])
+
+    def partitions(self):
+        """{name: (lower, upper)}; None bounds are MINVALUE / MAXVALUE, the default partition has neither"""
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = %s::regclass
+            """, [PARENT])
+            rows = cursor.fetchall()
+        partitions = {}
+        for name, bound in rows:
+            match = BOUND_RE.match(bound)
+            partitions[name] = (parse_bound(match[1]), parse_bound(match[2])) if match else (None, None)
+        return partitions
+
+    @staticmethod
+    def covered(existing, start, end):
+        """Whether a range partition already overlaps [start, end)"""
+        for name, (lower, upper) in existing.items():
+            if name == DEFAULT_PARTITION:
+                continue
+            if (lower is None or lower < end) and (upper is None or upper > start):
+                return True
+        return False
+
+    def run(self, description, statements):
+        """Run statements in one transaction; False if a lock wasn't granted within LOCK_TIMEOUT"""
+        if self.dry_run:
+            self.stdout.write(f'[dry run] {description}')
+            for sql, params in statements:
+                self.stdout.write('    ' + ' '.join(sql.split()) + (f'  -- {params}' if params else ''))
+            return True
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                # Never queue writers behind us for long; the next run retries
+                cursor.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+                for sql, params in statements:
+                    cursor.execute(sql, params)
+        except OperationalError as e:
+            self.stderr.write(f'{description} failed, will retry on the next run: {e}')
+            return False
+        self.stdout.write(self.style.SUCCESS(description))
+        return True
+
+    def create_partition(self, start, end):
+        # Created standalone, then attached: ATTACH only needs SHARE UPDATE EXCLUSIVE
+        # on usage_logs, so inserts keep flowing. Rows that landed in the default
+        # partition for this month must move first or the attach fails.
+        name = partition_name(start)
+        self.run(f'Created {name}', [
+            (f'CREATE TABLE {name} (LIKE {PARENT} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', []),
+            (f"""
+                WITH moved AS (
+                    DELETE FROM {DEFAULT_PARTITION} WHERE "timestamp" >= %s AND "timestamp" < %s RETURNING *
+                )
+                INSERT INTO {name} SELECT * FROM moved
+            """, [start, end]),
+            (f'ALTER TABLE {PARENT} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)', [start, end]),
+        ])
+
+    def expire_rows(self, name, cutoff, batch_size):
+        # Batches keep each DELETE's locks and WAL small; vacuum reclaims the space
+        sql = f"""
+            DELETE FROM {name} WHERE ctid = ANY(ARRAY(
+                SELECT ctid FROM {name} WHERE "timestamp" < %s LIMIT %s
+            ))
+        """
+        if self.dry_run:
+            self.run(f'Delete rows before {cutoff:%Y-%m-%d} from {name}', [(sql, [cutoff, batch_size])])
+            return
+        deleted = 0
+        while True:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(sql, [cutoff, batch_size])
+                batch = cursor.rowcount
+            deleted += batch
+            if batch < batch_size:
+                break
+        if deleted:
+            self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired rows from {name}'))
+
+    def expire_partition(self, name, detach):
+        if detach:
+            self.run(f'Detached {name}', [(f'ALTER TABLE {PARENT} DETACH PARTITION {name}', [])])
+        else:
+            self.run(f'Dropped {name}', [(f'DROP TABLE {name}', [])])
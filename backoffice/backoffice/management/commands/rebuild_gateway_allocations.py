@@ -0,0 +1,83 @@
+"""
+Rebuild the gateway allocation map in Redis (main.py "Gateway allocation map")
+from user_allocated_proxies.
+
+Covers every user with allocations plus every user that still has entries in
+Redis, so entries of deleted or deactivated users are removed. Use it after
+bulk SQL changes that bypass the signals, after a Redis flush, or
+periodically as a safety net.
+
+Users are handled in batches: per batch one lock pipeline, one query and one
+pipeline of replace scripts. A user whose lock is held is skipped, since
+whoever holds it is publishing that user's current rows right now.
+
+    python manage.py rebuild_gateway_allocations
+    python manage.py rebuild_gateway_allocations --batch-size 5000
+"""
+import secrets
+
+from django.core.management.base import BaseCommand
+
+from backoffice.cache import (
+    GATEWAY_ALLOC_LOCK_SECONDS, gateway_alloc_lock_key, gateway_allocation_args, gateway_user_allocs_key,
+    redis_client, replace_gateway_allocations,
+)
+from backoffice.models import UserAllocatedProxy
+
+USER_ALLOCS_PATTERN = gateway_user_allocs_key('*')
+
+RELEASE_LOCK_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+release_lock = redis_client.register_script(RELEASE_LOCK_LUA)
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the gateway allocation map in Redis from user_allocated_proxies'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        user_ids = set(UserAllocatedProxy.objects.values_list('user_id', flat=True).distinct())
+        prefix = USER_ALLOCS_PATTERN[:-1]
+        for key in redis_client.scan_iter(match=USER_ALLOCS_PATTERN, count=1000):
+            user_id = key[len(prefix):]
+            if user_id.isdigit():  # skips the :lock keys
+                user_ids.add(int(user_id))
+
+        user_ids = sorted(user_ids)
+        batch_size = options['batch_size']
+        published = entries = skipped = 0
+        for start in range(0, len(user_ids), batch_size):
+            done, written, busy = self.rebuild_batch(user_ids[start:start + batch_size])
+            published += done
+            entries += written
+            skipped += busy
+        self.stdout.write(self.style.SUCCESS(
+            f'Published {entries} gateway entries for {published} users '
+            f'({skipped} skipped while another writer held their lock)'
+        ))
+
+    def rebuild_batch(self, user_ids):
+        token = secrets.token_hex(8)
+        pipe = redis_client.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.set(gateway_alloc_lock_key(user_id), token, nx=True, ex=GATEWAY_ALLOC_LOCK_SECONDS)
+        locked = [user_id for user_id, acquired in zip(user_ids, pipe.execute()) if acquired]
+        try:
+            # Read after locking, so nothing published meanwhile is overwritten with older rows
+            args = gateway_allocation_args(locked)
+            pipe = redis_client.pipeline(transaction=False)
+            for user_id in locked:
+                replace_gateway_allocations(keys=[gateway_user_allocs_key(user_id)], args=args[user_id], client=pipe)
+            written = sum(pipe.execute())
+        finally:
+            pipe = redis_client.pipeline(transaction=False)
+            for user_id in locked:
+                release_lock(keys=[gateway_alloc_lock_key(user_id)], args=[token], client=pipe)
+            pipe.execute()
+        return len(locked), written, len(user_ids) - len(locked)
@@ -0,0 +1,137 @@
+"""
+Recount proxy_pools.current_users and subscriptions.allocated_proxies_count
+from user_allocated_proxies and fix any drift.
+
+Each counter is recomputed by one GROUP BY over user_allocated_proxies and
+compared with the stored values in the same statement, so only drifted rows
+leave the database. Fixes are applied as deltas (counter + actual - stored)
+in --batch-size UPDATEs, which stays correct when an allocation or release
+commits between the recount and the fix. Admin edits, bulk SQL and aborted
+allocations are the usual sources of drift.
+
+Prints a drift report (the --show largest differences per counter), and with
+--metrics-file writes Prometheus metrics for the node_exporter textfile
+collector. Fixed proxies are pushed to the FastAPI workers' proxy index and
+fixed users' cached subscriptions are dropped.
+
+    python manage.py reconcile_allocation_counters
+    python manage.py reconcile_allocation_counters --dry-run --show 50
+    python manage.py reconcile_allocation_counters --metrics-file /var/lib/node_exporter/proxyflow_counters.prom
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from prometheus_client import CollectorRegistry, Gauge, write_to_textfile
+
+from backoffice.cache import invalidate_user_cache, publish_proxy_changes
+
+
+def refresh_proxies(proxy_ids):
+    publish_proxy_changes(*proxy_ids)
+
+
+def refresh_subscriptions(user_ids):
+    for user_id in set(user_ids):
+        invalidate_user_cache(user_id)
+
+
+# (name, drift query returning (id, stored, actual) rows, fix statement, Redis refresh of the fixed rows)
+COUNTERS = [
+    ('current_users', """
+        SELECT p.id, p.current_users, coalesce(a.n, 0)
+        FROM proxy_pools p
+        LEFT JOIN (
+            SELECT proxy_pool_id, count(*) AS n FROM user_allocated_proxies GROUP BY proxy_pool_id
+        ) a ON a.proxy_pool_id = p.id
+        WHERE p.current_users IS DISTINCT FROM coalesce(a.n, 0)
+        ORDER BY p.id
+    """, """
+        UPDATE proxy_pools p
+        SET current_users = coalesce(p.current_users, 0) + v.delta
+        FROM unnest(%s::bigint[], %s::integer[]) AS v(id, delta)
+        WHERE p.id = v.id
+        RETURNING p.id
+    """, refresh_proxies),
+    ('allocated_proxies_count', """
+        SELECT s.id, s.allocated_proxies_count, coalesce(a.n, 0)
+        FROM subscriptions s
+        LEFT JOIN (
+            SELECT user_id, count(*) AS n FROM user_allocated_proxies GROUP BY user_id
+        ) a ON a.user_id = s.user_id
+        WHERE s.allocated_proxies_count IS DISTINCT FROM coalesce(a.n, 0)
+        ORDER BY s.id
+    """, """
+        UPDATE subscriptions s
+        SET allocated_proxies_count = coalesce(s.allocated_proxies_count, 0) + v.delta
+        FROM unnest(%s::bigint[], %s::integer[]) AS v(id, delta)
+        WHERE s.id = v.id
+        RETURNING s.user_id
+    """, refresh_subscriptions),
+]
+
+
+class Command(BaseCommand):
+    help = 'Recount current_users and allocated_proxies_count from user_allocated_proxies and fix drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='rows per UPDATE')
+        parser.add_argument('--show', type=int, default=10, help='largest differences listed per counter')
+        parser.add_argument('--dry-run', action='store_true', help='report drift without fixing it')
+        parser.add_argument('--metrics-file', help='write Prometheus metrics to this file')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        registry = CollectorRegistry()
+        drifted_rows = Gauge('proxyflow_counter_drift_rows', 'Rows whose stored counter differed from the recount',
+                             ['counter'], registry=registry)
+        drift_total = Gauge('proxyflow_counter_drift_abs', 'Sum of absolute differences found',
+                            ['counter'], registry=registry)
+        fixed_rows = Gauge('proxyflow_counter_fixed_rows', 'Rows corrected by the last run',
+                           ['counter'], registry=registry)
+
+        for name, drift_sql, fix_sql, refresh in COUNTERS:
+            with connection.cursor() as cursor:
+                cursor.execute(drift_sql)
+                rows = [(row_id, stored or 0, actual) for row_id, stored, actual in cursor.fetchall()]
+            drift = sum(abs(actual - stored) for _row_id, stored, actual in rows)
+            drifted_rows.labels(name).set(len(rows))
+            drift_total.labels(name).set(drift)
+            self.report(name, rows, drift, options['show'])
+
+            fixed = 0
+            if rows and not options['dry_run']:
+                fixed = self.fix(fix_sql, refresh, rows, options['batch_size'])
+                self.stdout.write(self.style.SUCCESS(f'  fixed {fixed} rows'))
+            fixed_rows.labels(name).set(fixed)
+
+        duration = time.monotonic() - started
+        self.stdout.write(f'Reconciled in {duration:.2f}s')
+        if options['metrics_file']:
+            Gauge('proxyflow_counter_reconcile_duration_seconds', 'Duration of the last run',
+                  registry=registry).set(duration)
+            Gauge('proxyflow_counter_reconcile_last_run_timestamp_seconds', 'When the last run finished',
+                  registry=registry).set_to_current_time()
+            write_to_textfile(options['metrics_file'], registry)
+
+    def report(self, name, rows, drift, show):
+        if not rows:
+            self.stdout.write(f'{name}: no drift')
+            return
+        self.stdout.write(self.style.WARNING(f'{name}: {len(rows)} rows drifted, {drift} in total'))
+        for row_id, stored, actual in sorted(rows, key=lambda row: -abs(row[2] - row[1]))[:show]:
+            self.stdout.write(f'  id {row_id}: stored {stored}, actual {actual} ({actual - stored:+d})')
+
+    def fix(self, fix_sql, refresh, rows, batch_size):
+        fixed = 0
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(fix_sql, [
+                    [row_id for row_id, _stored, _actual in batch],
+                    [actual - stored for _row_id, stored, actual in batch],
+                ])
+                touched = [row[0] for row in cursor.fetchall()]
+            fixed += len(touched)
+            refresh(touched)
+        return fixed
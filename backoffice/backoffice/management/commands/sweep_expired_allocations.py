@@ -0,0 +1,148 @@
+"""
+Reclaim the proxies of users whose subscription expired or was deactivated.
+
+Batches of --batch-size subscriptions are handled in one statement each:
+their user_allocated_proxies rows are deleted, proxy_pools.current_users is
+decremented with one grouped UPDATE, the gateway ports go on the
+gateway_free_ports list (/proxy/allocate hands them out again before new
+ones) and allocated_proxies_count is reset. Users who still have another
+active subscription are left alone. Subscriptions locked by a concurrent
+allocation or release are skipped and picked up on the next run.
+
+After each batch the users' cached rows, /proxy/list ETags and gateway map
+entries are refreshed, and FastAPI workers reload the touched proxies.
+
+    python manage.py sweep_expired_allocations
+    python manage.py sweep_expired_allocations --batch-size 5000 --dry-run
+"""
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from backoffice.cache import bump_alloc_versions, invalidate_user_cache, publish_gateway_allocations, publish_proxy_changes
+
+SWEEPABLE = """
+    (NOT s.is_active OR s.expires_at < now())
+    AND EXISTS (SELECT 1 FROM user_allocated_proxies held WHERE held.user_id = s.user_id)
+    AND NOT EXISTS (
+        SELECT 1 FROM subscriptions live
+        WHERE live.user_id = s.user_id AND live.is_active
+          AND (live.expires_at IS NULL OR live.expires_at >= now())
+    )
+"""
+
+SWEEP_SQL = f"""
+    WITH expired AS (
+        SELECT s.id, s.user_id
+        FROM subscriptions s
+        WHERE {SWEEPABLE}
+        ORDER BY s.id
+        LIMIT %s
+        FOR UPDATE OF s SKIP LOCKED
+    ),
+    released AS (
+        DELETE FROM user_allocated_proxies a
+        USING expired e
+        WHERE a.user_id = e.user_id
+        RETURNING a.user_id, a.proxy_pool_id, a.gateway_port
+    ),
+    freed AS (
+        INSERT INTO gateway_free_ports (port, released_at)
+        SELECT gateway_port, now() FROM released
+        ON CONFLICT (port) DO NOTHING
+        RETURNING port
+    ),
+    slots AS (
+        UPDATE proxy_pools p
+        SET current_users = greatest(p.current_users - r.n, 0)
+        FROM (SELECT proxy_pool_id, count(*) AS n FROM released GROUP BY proxy_pool_id) r
+        WHERE p.id = r.proxy_pool_id
+        RETURNING p.id, r.n
+    ),
+    reset AS (
+        UPDATE subscriptions s
+        SET allocated_proxies_count = 0
+        FROM expired e
+        WHERE s.id = e.id
+    )
+    SELECT
+        (SELECT count(*) FROM expired),
+        (SELECT coalesce(array_agg(DISTINCT user_id), '{{}}') FROM released),
+        (SELECT count(*) FROM released),
+        (SELECT count(*) FROM freed),
+        (SELECT coalesce(array_agg(id), '{{}}') FROM slots),
+        (SELECT coalesce(sum(n), 0) FROM slots)
+"""
+
+DRY_RUN_SQL = f"""
+    SELECT count(DISTINCT s.id), count(a.id), count(DISTINCT a.proxy_pool_id)
+    FROM subscriptions s
+    JOIN user_allocated_proxies a ON a.user_id = s.user_id
+    WHERE {SWEEPABLE}
+"""
+
+FREE_CAPACITY_SQL = """
+    SELECT coalesce(sum(greatest(max_users - current_users, 0)), 0),
+           count(*) FILTER (WHERE current_users < max_users),
+           (SELECT count(*) FROM gateway_free_ports)
+    FROM proxy_pools
+    WHERE is_active
+"""
+
+
+class Command(BaseCommand):
+    help = 'Release the proxy allocations of expired or inactive subscriptions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='subscriptions per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='only count what would be released')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            with connection.cursor() as cursor:
+                cursor.execute(DRY_RUN_SQL)
+                subscriptions, allocations, proxies = cursor.fetchone()
+            self.stdout.write(
+                f'[dry run] {subscriptions} subscriptions hold {allocations} allocations on {proxies} proxies'
+            )
+            return
+
+        free_before = self.free_capacity()[0]
+        subscriptions = allocations = ports = slots = 0
+        proxy_ids = set()
+        while True:
+            swept, released, freed, touched, reclaimed = self.sweep_batch(options['batch_size'])
+            subscriptions += swept
+            allocations += released
+            ports += freed
+            slots += reclaimed
+            proxy_ids.update(touched)
+            if swept < options['batch_size']:
+                break
+
+        free_slots, free_proxies, free_ports = self.free_capacity()
+        self.stdout.write(self.style.SUCCESS(
+            f'Released {allocations} allocations of {subscriptions} subscriptions: '
+            f'{slots} slots on {len(proxy_ids)} proxies and {ports} gateway ports reclaimed'
+        ))
+        self.stdout.write(
+            f'Free capacity {free_before} -> {free_slots} slots '
+            f'({free_proxies} proxies with room), {free_ports} ports on the free list'
+        )
+
+    def sweep_batch(self, batch_size):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(SWEEP_SQL, [batch_size])
+            swept, user_ids, released, freed, proxy_ids, reclaimed = cursor.fetchone()
+        if user_ids:
+            for user_id in user_ids:
+                invalidate_user_cache(user_id)
+            bump_alloc_versions(*user_ids)
+            publish_gateway_allocations(*user_ids)
+        if proxy_ids:
+            publish_proxy_changes(*proxy_ids)
+        return swept, released, freed, proxy_ids, int(reclaimed)
+
+    def free_capacity(self):
+        with connection.cursor() as cursor:
+            cursor.execute(FREE_CAPACITY_SQL)
+            return cursor.fetchone()
@@ -0,0 +1,48 @@
+# Per-user daily rollup of usage_logs for /user/stats
+# Backfills existing history; FastAPI keeps it current from then on
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BACKFILL_SQL = """
+INSERT INTO usage_daily_rollups (user_id, day, proxy_id, total_requests, successful_requests, data_used_mb)
+SELECT
+    user_id,
+    (timestamp AT TIME ZONE 'UTC')::date,
+    proxy_id,
+    count(*),
+    count(*) FILTER (WHERE success),
+    coalesce(sum(data_used_mb), 0)
+FROM usage_logs
+GROUP BY 1, 2, 3
+ON CONFLICT (user_id, day, proxy_id) DO NOTHING;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backoffice', '0005_add_proxy_auth_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UsageDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('proxy_id', models.IntegerField()),
+                ('total_requests', models.BigIntegerField(default=0)),
+                ('successful_requests', models.BigIntegerField(default=0)),
+                ('data_used_mb', models.FloatField(default=0.0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage_rollups', to='backoffice.user')),
+            ],
+            options={
+                'db_table': 'usage_daily_rollups',
+                'managed': True,
+                'unique_together': {('user', 'day', 'proxy_id')},
+            },
+        ),
+        migrations.RunSQL(BACKFILL_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,25 @@
+# Sequence for gateway ports handed out by /proxy/allocate
+# Starts past the highest port already allocated
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backoffice', '0006_usagedailyrollup'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+                CREATE SEQUENCE IF NOT EXISTS gateway_port_seq START WITH 10000 MINVALUE 10000;
+                SELECT setval(
+                    'gateway_port_seq',
+                    GREATEST(10000, (SELECT COALESCE(MAX(gateway_port) + 1, 10000) FROM user_allocated_proxies)),
+                    false
+                );
+            """,
+            reverse_sql="DROP SEQUENCE IF EXISTS gateway_port_seq;",
+        ),
+    ]
@@ -0,0 +1,18 @@
+# (ip_address, port) must be unique for import_proxies.py's ON CONFLICT upsert.
+# Fails if duplicates already exist; merge them in the admin first.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backoffice', '0007_gateway_port_seq'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='proxypool',
+            constraint=models.UniqueConstraint(fields=('ip_address', 'port'), name='proxy_pools_ip_port_uniq'),
+        ),
+    ]
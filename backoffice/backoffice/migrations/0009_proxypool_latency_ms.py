@@ -0,0 +1,18 @@
+# Latency measured by health_checker.py (success_rate is maintained there too)
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backoffice', '0008_proxypool_unique_ip_port'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='proxypool',
+            name='latency_ms',
+            field=models.FloatField(blank=True, help_text='Tunnel setup time (EWMA) measured by health_checker.py', null=True),
+        ),
+    ]
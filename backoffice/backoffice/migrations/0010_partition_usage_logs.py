@@ -0,0 +1,156 @@
+# Turns usage_logs into a table range-partitioned by month (UTC) on "timestamp"
+# The existing table is not copied: it becomes the partition usage_logs_legacy
+# covering everything before the first monthly partition (start of the month
+# after next). Its indexes and the CHECK constraint that lets ATTACH skip the
+# validation scan are built first without blocking writes (CONCURRENTLY /
+# NOT VALID + VALIDATE), so ACCESS EXCLUSIVE is only held for catalog changes.
+# usage_logs_default catches rows no partition covers.
+# Upcoming partitions and retention: manage.py manage_usage_partitions
+# Partitioned tables need the partition key in the primary key: (id, timestamp)
+
+from datetime import datetime, timezone
+
+from django.db import migrations, models, transaction
+
+
+def first_monthly_partition():
+    now = datetime.now(timezone.utc)
+    month = now.month + 2
+    return datetime(now.year + (month - 1) // 12, (month - 1) % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+CHECK_SQL = """
+ALTER TABLE usage_logs ADD CONSTRAINT usage_logs_legacy_range_check
+    CHECK ("timestamp" < %(cutoff)s) NOT VALID
+"""
+
+SWITCH_SQL = """
+LOCK TABLE usage_logs IN ACCESS EXCLUSIVE MODE;
+ALTER TABLE usage_logs RENAME TO usage_logs_legacy;
+
+-- The partitioned table owns the id sequence; the legacy primary key becomes (id, timestamp)
+ALTER TABLE usage_logs_legacy ALTER COLUMN id DROP IDENTITY IF EXISTS;
+ALTER TABLE usage_logs_legacy DROP CONSTRAINT usage_logs_pkey;
+ALTER TABLE usage_logs_legacy ADD CONSTRAINT usage_logs_legacy_pkey PRIMARY KEY USING INDEX usage_logs_legacy_id_ts_uniq;
+
+-- Plain sequence instead of an identity column, continuing the old ids
+CREATE SEQUENCE usage_logs_part_id_seq;
+SELECT setval('usage_logs_part_id_seq', (SELECT COALESCE(MAX(id), 0) + 1 FROM usage_logs_legacy), false);
+
+CREATE TABLE usage_logs (
+    id bigint NOT NULL DEFAULT nextval('usage_logs_part_id_seq'),
+    proxy_id integer NOT NULL,
+    data_used_mb double precision NOT NULL,
+    request_count integer NOT NULL,
+    "timestamp" timestamp with time zone NOT NULL,
+    success boolean NOT NULL,
+    user_id bigint NOT NULL,
+    CONSTRAINT usage_logs_pkey_part PRIMARY KEY (id, "timestamp"),
+    CONSTRAINT usage_logs_user_id_fk_users_id FOREIGN KEY (user_id)
+        REFERENCES users (id) DEFERRABLE INITIALLY DEFERRED
+) PARTITION BY RANGE ("timestamp");
+ALTER SEQUENCE usage_logs_part_id_seq OWNED BY usage_logs.id;
+
+CREATE INDEX usage_logs_user_ts_idx ON usage_logs (user_id, "timestamp");
+CREATE INDEX usage_logs_ts_idx ON usage_logs ("timestamp");
+
+-- Matching indexes, FK and the validated CHECK already exist: no build, no scan
+ALTER TABLE usage_logs ATTACH PARTITION usage_logs_legacy FOR VALUES FROM (MINVALUE) TO (%(cutoff)s);
+ALTER TABLE usage_logs_legacy DROP CONSTRAINT usage_logs_legacy_range_check;
+
+CREATE TABLE usage_logs_default PARTITION OF usage_logs DEFAULT;
+
+-- Monthly partitions from the end of the legacy one up to three months ahead.
+-- Month arithmetic on UTC timestamps so bounds don't depend on the session time zone
+DO $$
+DECLARE
+    month_start timestamp := %(cutoff)s::timestamptz AT TIME ZONE 'UTC';
+    last_month timestamp := date_trunc('month', now() AT TIME ZONE 'UTC') + interval '3 months';
+BEGIN
+    WHILE month_start <= last_month LOOP
+        EXECUTE format(
+            'CREATE TABLE %%I PARTITION OF usage_logs FOR VALUES FROM (%%L) TO (%%L)',
+            'usage_logs_p' || to_char(month_start, 'YYYYMM'),
+            month_start AT TIME ZONE 'UTC',
+            (month_start + interval '1 month') AT TIME ZONE 'UTC'
+        );
+        month_start := month_start + interval '1 month';
+    END LOOP;
+END $$;
+"""
+
+REVERSE_SQL = """
+ALTER TABLE usage_logs RENAME TO usage_logs_partitioned;
+
+CREATE TABLE usage_logs (
+    id bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    proxy_id integer NOT NULL,
+    data_used_mb double precision NOT NULL,
+    request_count integer NOT NULL,
+    "timestamp" timestamp with time zone NOT NULL,
+    success boolean NOT NULL,
+    user_id bigint NOT NULL REFERENCES users (id) DEFERRABLE INITIALLY DEFERRED
+);
+CREATE INDEX usage_logs_user_id_idx ON usage_logs (user_id);
+
+INSERT INTO usage_logs (id, proxy_id, data_used_mb, request_count, "timestamp", success, user_id)
+OVERRIDING SYSTEM VALUE
+SELECT id, proxy_id, data_used_mb, request_count, "timestamp", success, user_id
+FROM usage_logs_partitioned;
+SELECT setval(pg_get_serial_sequence('usage_logs', 'id'), (SELECT COALESCE(MAX(id), 0) + 1 FROM usage_logs), false);
+
+DROP TABLE usage_logs_partitioned;
+"""
+
+
+def partition_usage_logs(apps, schema_editor):
+    params = {'cutoff': first_monthly_partition()}
+    # NOT VALID only needs a brief lock; VALIDATE scans under SHARE UPDATE EXCLUSIVE, inserts keep going
+    schema_editor.execute(CHECK_SQL, params)
+    schema_editor.execute('ALTER TABLE usage_logs VALIDATE CONSTRAINT usage_logs_legacy_range_check')
+    with transaction.atomic(using=schema_editor.connection.alias):
+        schema_editor.execute(SWITCH_SQL, params)
+
+
+def unpartition_usage_logs(apps, schema_editor):
+    with transaction.atomic(using=schema_editor.connection.alias):
+        schema_editor.execute(REVERSE_SQL)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('backoffice', '0009_proxypool_latency_ms'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    'CREATE UNIQUE INDEX CONCURRENTLY usage_logs_legacy_id_ts_uniq ON usage_logs (id, "timestamp")',
+                    reverse_sql=migrations.RunSQL.noop,
+                ),
+                migrations.RunSQL(
+                    'CREATE INDEX CONCURRENTLY usage_logs_legacy_user_ts_idx ON usage_logs (user_id, "timestamp")',
+                    reverse_sql=migrations.RunSQL.noop,
+                ),
+                migrations.RunSQL(
+                    'CREATE INDEX CONCURRENTLY usage_logs_legacy_ts_idx ON usage_logs ("timestamp")',
+                    reverse_sql=migrations.RunSQL.noop,
+                ),
+                migrations.RunPython(partition_usage_logs, unpartition_usage_logs),
+            ],
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='usagelog',
+                    index=models.Index(fields=['user', 'timestamp'], name='usage_logs_user_ts_idx'),
+                ),
+                migrations.AddIndex(
+                    model_name='usagelog',
+                    index=models.Index(fields=['timestamp'], name='usage_logs_ts_idx'),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Free list of gateway ports released by /proxy/{id}/release and
+# sweep_expired_allocations; /proxy/allocate takes from it before gateway_port_seq
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backoffice', '0010_partition_usage_logs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GatewayFreePort',
+            fields=[
+                ('port', models.IntegerField(primary_key=True, serialize=False)),
+                ('released_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'gateway_free_ports',
+                'managed': True,
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Partial indexes for the queries that read proxy_pools by load and by type/country
+# Built CONCURRENTLY, so allocations and health checks keep writing meanwhile
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+from django.db.models import F, Q
+from django.db.models.functions import Cast, Greatest
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('backoffice', '0011_gatewayfreeport'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='proxypool',
+            index=models.Index(
+                Cast('current_users', models.FloatField()) / Greatest('max_users', 1),
+                F('success_rate').desc(),
+                name='proxy_pools_alloc_order_idx',
+                condition=Q(is_active=True, current_users__lt=F('max_users')),
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name='proxypool',
+            index=models.Index(
+                fields=['proxy_type', 'country'],
+                name='proxy_pools_active_type_idx',
+                condition=Q(is_active=True),
+            ),
+        ),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import F, Q
+from django.db.models.functions import Cast, Greatest
 from django.utils import timezone
 
 
@@ -51,6 +53,7 @@ class ProxyPool(models.Model):
     is_active = models.BooleanField(default=True)
     last_used = models.DateTimeField(null=True, blank=True)
     success_rate = models.FloatField(default=100.0)
+    latency_ms = models.FloatField(null=True, blank=True, help_text="Tunnel setup time (EWMA) measured by health_checker.py")
     
     # Shared proxies support
     max_users = models.IntegerField(default=10, help_text="Max users that can use this proxy. Set to 1 for dedicated.")
@@ -61,6 +64,26 @@ class ProxyPool(models.Model):
         managed = True
         verbose_name = 'Proxy Pool'
         verbose_name_plural = 'Proxy Pools'
+        constraints = [
+            # Upsert key for import_proxies.py
+            models.UniqueConstraint(fields=['ip_address', 'port'], name='proxy_pools_ip_port_uniq'),
+        ]
+        indexes = [
+            # /proxy/allocate fallback (main.py ALLOCATE_PROXIES_SQL): least loaded
+            # proxies with room, read in index order instead of sorting the table
+            models.Index(
+                Cast('current_users', models.FloatField()) / Greatest('max_users', 1),
+                F('success_rate').desc(),
+                name='proxy_pools_alloc_order_idx',
+                condition=Q(is_active=True, current_users__lt=F('max_users')),
+            ),
+            # Active proxies by type and country (admin filters, availability lookups)
+            models.Index(
+                fields=['proxy_type', 'country'],
+                name='proxy_pools_active_type_idx',
+                condition=Q(is_active=True),
+            ),
+        ]
     
     def __str__(self):
         return f"{self.proxy_type} - {self.ip_address}:{self.port} ({self.country})"
@@ -126,6 +149,19 @@ class UserAllocatedProxy(models.Model):
         return f"{self.user.username} → Port {self.gateway_port} → {self.proxy_pool}"
 
 
+class GatewayFreePort(models.Model):
+    """Released gateway ports, handed out again by /proxy/allocate before new ones"""
+    port = models.IntegerField(primary_key=True)
+    released_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'gateway_free_ports'
+        managed = True
+
+    def __str__(self):
+        return f"Port {self.port}"
+
+
 class UsageLog(models.Model):
     """Maps to FastAPI's usage_logs table"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='usage_logs')
@@ -139,6 +175,28 @@ class UsageLog(models.Model):
         db_table = 'usage_logs'
         managed = True
         ordering = ['-timestamp']
+        # Partitioned by month on timestamp (migration 0010, manage_usage_partitions)
+        indexes = [
+            models.Index(fields=['user', 'timestamp'], name='usage_logs_user_ts_idx'),
+            models.Index(fields=['timestamp'], name='usage_logs_ts_idx'),
+        ]
     
     def __str__(self):
-        return f"User {self.user.username} - {self.timestamp}"
\ No newline at end of file
+        return f"User {self.user.username} - {self.timestamp}"
+
+class UsageDailyRollup(models.Model):
+    """Per-user daily aggregate of usage_logs, maintained by FastAPI on insert"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='usage_rollups')
+    day = models.DateField()
+    proxy_id = models.IntegerField()  # Kept per proxy so unique proxy counts stay exact
+    total_requests = models.BigIntegerField(default=0)
+    successful_requests = models.BigIntegerField(default=0)
+    data_used_mb = models.FloatField(default=0.0)
+
+    class Meta:
+        db_table = 'usage_daily_rollups'
+        managed = True
+        unique_together = [['user', 'day', 'proxy_id']]
+
+    def __str__(self):
+        return f"User {self.user_id} - {self.day} - proxy {self.proxy_id}"
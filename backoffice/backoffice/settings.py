@@ -72,11 +72,22 @@ DATABASES = {
         'NAME': 'proxyflow',
         'USER': 'proxyuser',
         'PASSWORD': 'proxypass123',
-        'HOST': 'postgres',
-        'PORT': '5432',
+        'HOST': os.environ.get('DJANGO_DB_HOST', 'postgres'),
+        'PORT': os.environ.get('DJANGO_DB_PORT', '5432'),
+        # Keep connections across requests instead of one per request; 0 closes
+        # after each request. Health-checked before reuse.
+        'CONN_MAX_AGE': int(os.environ.get('DJANGO_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
+        # PgBouncer in transaction pooling mode works as is (DJANGO_DB_HOST=pgbouncer,
+        # DJANGO_DB_PORT=6432): psycopg2 never prepares statements server-side, and
+        # the usage CSV export, the only QuerySet.iterator() user, keeps its
+        # server-side cursor inside one transaction.
     }
 }
 
+# Redis (shared with FastAPI; used to invalidate its auth cache)
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://redis:6379/0')
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -0,0 +1,84 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .cache import (
+    bump_alloc_versions, invalidate_user_cache, publish_gateway_allocations, publish_proxy_changes, sync_quota,
+)
+from .models import ProxyPool, Subscription, User, UserAllocatedProxy
+
+
+@receiver(pre_save, sender=User)
+def remember_old_api_key(sender, instance, **kwargs):
+    # An API key change must also evict the entry cached under the old key
+    instance._old_api_key = None
+    if instance.pk:
+        instance._old_api_key = (
+            User.objects.filter(pk=instance.pk).values_list('api_key', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user(sender, instance, **kwargs):
+    api_keys = (instance.api_key, getattr(instance, '_old_api_key', None))
+    transaction.on_commit(lambda: invalidate_user_cache(instance.pk, *api_keys))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def publish_user_gateway_allocations(sender, instance, **kwargs):
+    # Username, API key and is_active are all part of the gateway entries
+    user_id = instance.pk
+    transaction.on_commit(lambda: publish_gateway_allocations(user_id))
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def invalidate_subscription(sender, instance, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate_user_cache(user_id))
+
+
+@receiver(post_save, sender=Subscription)
+def sync_subscription_quota(sender, instance, created, **kwargs):
+    # The used counter lives in Redis; only a new subscription or an explicit reset writes it
+    user_id, limit_gb, used_gb = instance.user_id, instance.data_limit_gb, instance.data_used_gb
+    mode = 'seed' if created else getattr(instance, '_quota_mode', 'keep')
+    transaction.on_commit(lambda: sync_quota(user_id, limit_gb, used_gb, mode))
+
+
+@receiver(post_delete, sender=Subscription)
+def drop_subscription_quota(sender, instance, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: sync_quota(user_id, None))
+
+
+@receiver(post_save, sender=ProxyPool)
+@receiver(post_delete, sender=ProxyPool)
+def publish_proxy_change(sender, instance, **kwargs):
+    proxy_id = instance.pk
+    transaction.on_commit(lambda: publish_proxy_changes(proxy_id))
+
+
+@receiver(post_save, sender=ProxyPool)
+def bump_proxy_users_alloc_version(sender, instance, created, **kwargs):
+    # /proxy/list shows the pool's type and country to everyone allocated to it
+    if created:
+        return
+    user_ids = list(
+        UserAllocatedProxy.objects.filter(proxy_pool=instance)
+        .values_list('user_id', flat=True).distinct()
+    )
+    if user_ids:
+        transaction.on_commit(lambda: bump_alloc_versions(*user_ids))
+        # Gateway entries carry the upstream address and credentials
+        transaction.on_commit(lambda: publish_gateway_allocations(*user_ids))
+
+
+@receiver(post_save, sender=UserAllocatedProxy)
+@receiver(post_delete, sender=UserAllocatedProxy)
+def bump_allocation_version(sender, instance, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: bump_alloc_versions(user_id))
+    transaction.on_commit(lambda: publish_gateway_allocations(user_id))
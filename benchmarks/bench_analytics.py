@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Analytics event buffer: record() cost, flush throughput and spill/replay.
+
+Records --events API events through analytics.AnalyticsBuffer and flushes
+them in batches of --batch. Inserts go to a real ClickHouse with --clickhouse
+(CLICKHOUSE_* env, api_events from clickhouse_schema.sql). Without it they go
+to a recording fake client that keeps every inserted column. The fake can
+fail its first --fail-inserts INSERTs, to exercise the disk spill, and checks
+that every event arrived exactly once.
+
+With --clickhouse, --compare-rows also times the same batches sent row-wise
+(list of tuples, columnar=False) for comparison.
+
+    python benchmarks/bench_analytics.py --events 1000000 --batch 10000 --fail-inserts 5
+    python benchmarks/bench_analytics.py --clickhouse --events 1000000 --compare-rows
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import analytics  # noqa: E402
+from clickhouse_driver.errors import NetworkError  # noqa: E402
+
+
+class RecordingClient:
+    """Stands in for clickhouse_driver.Client: keeps inserted columns, fails the first fail_inserts calls"""
+    inserted_ids = []
+    inserts = 0
+    fail_inserts = 0
+
+    def execute(self, query, columns, columnar=False, types_check=False):
+        assert query == analytics.INSERT_API_EVENTS and columnar
+        RecordingClient.inserts += 1
+        if RecordingClient.fail_inserts:
+            RecordingClient.fail_inserts -= 1
+            raise NetworkError("recorded outage")
+        proxy_ids = columns[analytics.API_EVENT_COLUMNS.index("proxy_id")]
+        RecordingClient.inserted_ids.extend(proxy_ids)
+
+    def disconnect(self):
+        pass
+
+
+def record_events(buffer, first_id, n, rng):
+    types = ("RESIDENTIAL", "DATACENTER", "MOBILE", "ISP")
+    countries = ("US", "DE", "GB", "FR", "NL", "")
+    for proxy_id in range(first_id, first_id + n):
+        buffer.record("proxy_issued", rng.randrange(1, 10000), proxy_id, rng.choice(types), rng.choice(countries),
+                      "/proxy/get")
+
+
+async def bench(args):
+    rng = random.Random(1)
+    spill_dir = tempfile.mkdtemp(prefix="bench-analytics-")
+    try:
+        if args.clickhouse:
+            factory = lambda: analytics.new_client(send_receive_timeout=analytics.ANALYTICS_INSERT_TIMEOUT_SECONDS)
+        else:
+            RecordingClient.fail_inserts = args.fail_inserts
+            factory = RecordingClient
+        buffer = analytics.AnalyticsBuffer(factory, analytics.SpillDirectory(spill_dir), max_events=args.batch)
+
+        record_seconds = flush_seconds = 0.0
+        batches = []
+        remaining = args.events
+        while remaining:
+            n = min(args.batch, remaining)
+            remaining -= n
+            started = time.perf_counter()
+            record_events(buffer, args.events - remaining - n + 1, n, rng)
+            record_seconds += time.perf_counter() - started
+            if args.compare_rows:
+                batches.append([list(column) for column in buffer.columns.values()])
+            started = time.perf_counter()
+            await buffer.flush()
+            flush_seconds += time.perf_counter() - started
+
+        # Catch up on whatever is still spilled
+        while buffer.spill.pending():
+            started = time.perf_counter()
+            await buffer.flush()
+            flush_seconds += time.perf_counter() - started
+
+        print(f"{args.events} events, batches of {args.batch} ({'ClickHouse' if args.clickhouse else 'fake client'})")
+        print(f"  record()  {record_seconds / args.events * 1e6:.2f} us/event")
+        print(f"  columnar  {flush_seconds:.2f}s flushing -> {args.events / flush_seconds:,.0f} events/s")
+
+        if args.compare_rows:
+            client = factory()
+            started = time.perf_counter()
+            for columns in batches:
+                client.execute(analytics.INSERT_API_EVENTS, list(zip(*columns)), types_check=False)
+            elapsed = time.perf_counter() - started
+            print(f"  row-wise  {elapsed:.2f}s -> {args.events / elapsed:,.0f} events/s")
+
+        if not args.clickhouse:
+            ids = RecordingClient.inserted_ids
+            print(f"  {RecordingClient.inserts} INSERTs ({args.fail_inserts} failed and spilled), "
+                  f"{len(ids)} rows received, {len(set(ids))} distinct")
+            assert sorted(ids) == list(range(1, args.events + 1)), "events lost or duplicated"
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=1000000)
+    parser.add_argument("--batch", type=int, default=analytics.ANALYTICS_FLUSH_MAX_EVENTS)
+    parser.add_argument("--clickhouse", action="store_true", help="insert into the configured ClickHouse")
+    parser.add_argument("--fail-inserts", type=int, default=0, help="fake client: INSERTs to fail first")
+    parser.add_argument("--compare-rows", action="store_true", help="also time row-wise INSERTs (ClickHouse)")
+    args = parser.parse_args()
+    if args.compare_rows and not args.clickhouse:
+        parser.error("--compare-rows needs --clickhouse")
+    asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Health checker probe throughput against a local fake proxy.
+
+Starts an in-process fake upstream on 127.0.0.1 that speaks both HTTP CONNECT
+and SOCKS5 (username/password auth). It answers after --delay-ms and refuses
+--fail-rate of the tunnels. It then runs health_checker.probe_all over
+--proxies targets pointing at it and reports probes/s, success counts and
+latency percentiles. No database or Redis needed.
+
+    python benchmarks/bench_health_checker.py --proxies 20000 --concurrency 1000
+    python benchmarks/bench_health_checker.py --fail-rate 0.3 --hang-rate 0.05 --timeout 1
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import health_checker  # noqa: E402
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+class FakeProxy:
+    def __init__(self, delay_ms, fail_rate, hang_rate):
+        self.delay = delay_ms / 1000
+        self.fail_rate = fail_rate
+        self.hang_rate = hang_rate
+        self.stopping = asyncio.Event()
+
+    async def handle(self, reader, writer):
+        try:
+            first = await reader.readexactly(1)
+            if random.random() < self.hang_rate:
+                await self.stopping.wait()  # never answers; the probe must time out
+                return
+            await asyncio.sleep(self.delay)
+            ok = random.random() >= self.fail_rate
+            if first == b"\x05":
+                await self._socks5(reader, writer, ok)
+            else:
+                await reader.readuntil(b"\r\n\r\n")
+                writer.write(b"HTTP/1.1 200 Connection established\r\n\r\n" if ok
+                             else b"HTTP/1.1 502 Bad Gateway\r\n\r\n")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+    async def _socks5(self, reader, writer, ok):
+        (n_methods,) = await reader.readexactly(1)
+        methods = await reader.readexactly(n_methods)
+        if 2 in methods:
+            writer.write(b"\x05\x02")
+            await writer.drain()
+            await reader.readexactly(1)
+            user_len = (await reader.readexactly(1))[0]
+            await reader.readexactly(user_len)
+            password_len = (await reader.readexactly(1))[0]
+            await reader.readexactly(password_len)
+            writer.write(b"\x01\x00")
+        else:
+            writer.write(b"\x05\x00")
+        await writer.drain()
+        header = await reader.readexactly(4)
+        name_len = (await reader.readexactly(1))[0] if header[3] == 3 else 4
+        await reader.readexactly(name_len + 2)
+        writer.write(b"\x05" + (b"\x00" if ok else b"\x05") + b"\x00\x01" + b"\x00" * 6)
+        await writer.drain()
+
+
+async def bench(args):
+    fake = FakeProxy(args.delay_ms, args.fail_rate, args.hang_rate)
+    server = await asyncio.start_server(fake.handle, "127.0.0.1", 0, backlog=4096)
+    port = server.sockets[0].getsockname()[1]
+
+    proxies = [
+        health_checker.ProxyTarget(
+            i, "127.0.0.1", port,
+            health_checker.SCHEME_SOCKS5 if i % 2 else 1,
+            "user" if i % 3 == 0 else "", "pass" if i % 3 == 0 else "",
+        )
+        for i in range(args.proxies)
+    ]
+
+    latencies, ok, failed = [], 0, 0
+    started = time.perf_counter()
+    async with server:
+        async for result in health_checker.probe_all(proxies, args.concurrency, "example.com:443", args.timeout):
+            if result.ok:
+                ok += 1
+                latencies.append(result.latency_ms)
+            else:
+                failed += 1
+        elapsed = time.perf_counter() - started
+        fake.stopping.set()
+        await asyncio.sleep(0)
+
+    print(f"{args.proxies} probes in {elapsed:.2f}s -> {args.proxies / elapsed:,.0f} probes/s "
+          f"(concurrency {args.concurrency})")
+    print(f"  ok {ok}  failed {failed}  (expected failure share ~{args.fail_rate + args.hang_rate:.0%})")
+    if latencies:
+        print(f"  tunnel setup ms  p50 {percentile(latencies, 50):.1f}  p95 {percentile(latencies, 95):.1f}"
+              f"  p99 {percentile(latencies, 99):.1f}")
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--proxies", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=1000)
+    parser.add_argument("--timeout", type=float, default=2.0)
+    parser.add_argument("--delay-ms", type=float, default=20.0, help="fake upstream answer delay")
+    parser.add_argument("--fail-rate", type=float, default=0.1, help="share of tunnels refused")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="share of connections never answered")
+    args = parser.parse_args()
+    asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    run()
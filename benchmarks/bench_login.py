@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Login throughput benchmark.
+
+http mode: registers a throwaway user on a running API, then fires --requests
+/auth/login calls with --concurrency in flight and reports throughput,
+latency percentiles and how many calls were shed with 503.
+
+    python benchmarks/bench_login.py --url http://localhost:8000 --requests 500 --concurrency 64
+
+pool mode: no server; compares bcrypt inline in a thread pool (the old
+behaviour) with main.run_password_hash (process pool) for raw hashes/second.
+
+    python benchmarks/bench_login.py --mode pool --requests 200
+"""
+import argparse
+import asyncio
+import os
+import secrets
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def report(name, elapsed, latencies, status_counts=None):
+    print(f"{name}: {len(latencies)} calls in {elapsed:.2f}s -> {len(latencies) / elapsed:.1f}/s")
+    print(f"  latency ms  p50 {percentile(latencies, 50):.1f}  p95 {percentile(latencies, 95):.1f}"
+          f"  p99 {percentile(latencies, 99):.1f}  mean {statistics.mean(latencies):.1f}")
+    if status_counts:
+        print("  status codes: " + ", ".join(f"{code}={n}" for code, n in sorted(status_counts.items())))
+
+
+async def bench_http(url, total, concurrency):
+    import httpx
+
+    email = f"bench-login-{secrets.token_hex(4)}@proxyflow.local"
+    password = secrets.token_urlsafe(12)
+    async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+        r = await client.post("/auth/register", json={"email": email, "password": password})
+        r.raise_for_status()
+
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies, status_counts = [], {}
+
+        async def one():
+            async with semaphore:
+                started = time.perf_counter()
+                resp = await client.post("/auth/login", json={"email": email, "password": password})
+                latencies.append((time.perf_counter() - started) * 1000)
+                status_counts[resp.status_code] = status_counts.get(resp.status_code, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        report("http /auth/login", time.perf_counter() - started, latencies, status_counts)
+
+
+async def bench_pool(total, concurrency):
+    import main
+
+    hashed = main.hash_password("benchmark-password")
+
+    async def run(name, call):
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def one():
+            async with semaphore:
+                started = time.perf_counter()
+                await call()
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        report(name, time.perf_counter() - started, latencies)
+
+    loop = asyncio.get_running_loop()
+    threads = ThreadPoolExecutor(max_workers=40)  # AnyIO's default threadpool size
+    await run("threadpool (inline bcrypt)",
+              lambda: loop.run_in_executor(threads, main.verify_password, "benchmark-password", hashed))
+
+    main.PASSWORD_HASH_MAX_PENDING = total  # measure throughput, not shedding
+    await run(f"process pool ({main.PASSWORD_HASH_WORKERS} workers)",
+              lambda: main.run_password_hash(main.verify_password, "benchmark-password", hashed))
+    main.get_password_hash_pool().shutdown()
+    threads.shutdown()
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["http", "pool"], default="http")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+
+    if args.mode == "http":
+        asyncio.run(bench_http(args.url, args.requests, args.concurrency))
+    else:
+        asyncio.run(bench_pool(args.requests, args.concurrency))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Proxy selection simulation: load balance and tail latency per strategy.
+
+Builds a synthetic pool (mixed capacities, ~85% healthy / 10% degraded / 5%
+bad proxies with matching success rates and latencies), then replays
+--requests selections of --quantity proxies each through every strategy in
+selection.py, plus "limit_n": always the first n rows, i.e. what a plain
+LIMIT query returns.
+
+Simulated request latency = the proxy's base latency x lognormal noise x a
+load penalty (capped at 51x) that grows with its recent share of traffic
+relative to its capacity, where recent = exponentially decayed over --window
+requests. Failures follow the proxy's success rate, and overloaded proxies
+(more than 2x their fair share) fail more.
+
+Reported per strategy: traffic share / fair share (max and coefficient of
+variation across proxies), latency p50/p95/p99, failure rate and selection
+cost in microseconds.
+
+    python benchmarks/bench_selection.py --proxies 2000 --requests 50000 --quantity 5
+"""
+import argparse
+import math
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from selection import STRATEGIES, Candidate, SelectionStrategy, build_strategy  # noqa: E402
+
+
+class LimitNStrategy(SelectionStrategy):
+    """Baseline: the same first rows every time"""
+    name = "limit_n"
+
+    def _pick(self, k, key):
+        return list(range(k))
+
+
+def make_pool(n, rng):
+    pool, base_latency = [], {}
+    for proxy_id in range(1, n + 1):
+        roll = rng.random()
+        if roll < 0.85:
+            success, latency = rng.uniform(95, 100), rng.lognormvariate(math.log(120), 0.3)
+        elif roll < 0.95:
+            success, latency = rng.uniform(60, 90), rng.lognormvariate(math.log(400), 0.4)
+        else:
+            success, latency = rng.uniform(5, 40), rng.lognormvariate(math.log(1500), 0.5)
+        capacity = rng.choice((1, 5, 10, 10, 20))
+        # The health checker's view is a noisy EWMA of the truth
+        measured = Candidate(proxy_id, min(100.0, success + rng.gauss(0, 3)), latency * rng.uniform(0.8, 1.2),
+                             0, capacity)
+        pool.append(measured)
+        base_latency[proxy_id] = (latency, success)
+    return pool, base_latency
+
+
+def simulate(strategy, pool, truth, args, rng):
+    total_capacity = sum(c.max_users for c in pool)
+    capacity = {c.id: c.max_users for c in pool}
+    decay = 1.0 - 1.0 / args.window
+    recent = {c.id: (0.0, 0) for c in pool}  # decayed handouts, last tick
+    handouts = {c.id: 0 for c in pool}
+    latencies, failures, select_seconds = [], 0, 0.0
+
+    for tick in range(args.requests):
+        user_id = rng.randrange(args.users)
+        started = time.perf_counter()
+        picked = strategy.select(args.quantity, key=user_id)
+        select_seconds += time.perf_counter() - started
+
+        for proxy_id in picked:
+            value, last = recent[proxy_id]
+            value = value * decay ** (tick - last) + 1.0
+            recent[proxy_id] = (value, tick)
+            handouts[proxy_id] += 1
+
+            fair = args.window * args.quantity * capacity[proxy_id] / total_capacity
+            relative = value / fair
+            base, success = truth[proxy_id]
+            latencies.append(base * rng.lognormvariate(0, 0.25) * (1 + 0.5 * min(relative, 10) ** 2))
+            failure_p = 1 - success / 100 + (0.2 if relative > 2 else 0.0)
+            failures += rng.random() < failure_p
+
+    shares = [
+        handouts[c.id] / (args.requests * args.quantity * c.max_users / total_capacity)
+        for c in pool
+    ]
+    latencies.sort()
+    return {
+        "max_share": max(shares),
+        "share_cov": statistics.pstdev(shares) / statistics.mean(shares),
+        "p50": latencies[len(latencies) // 2],
+        "p95": latencies[int(len(latencies) * 0.95)],
+        "p99": latencies[int(len(latencies) * 0.99)],
+        "failure_rate": failures / len(latencies),
+        "select_us": select_seconds / args.requests * 1e6,
+    }
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--proxies", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=50000)
+    parser.add_argument("--quantity", type=int, default=5)
+    parser.add_argument("--users", type=int, default=1000, help="distinct callers (sticky strategy key)")
+    parser.add_argument("--window", type=int, default=2000, help="requests over which load decays")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    pool, truth = make_pool(args.proxies, random.Random(args.seed))
+    print(f"{args.proxies} proxies, {args.requests} requests x {args.quantity} proxies, {args.users} users\n")
+    print(f"{'strategy':<13} {'max share':>9} {'share CoV':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+          f" {'fail %':>7} {'select us':>9}")
+
+    names = ["limit_n"] + list(STRATEGIES)
+    for name in names:
+        rng = random.Random(args.seed)
+        if name == "limit_n":
+            strategy = LimitNStrategy(pool, rng)
+        else:
+            strategy = build_strategy(name, pool, rng)
+        r = simulate(strategy, pool, truth, args, rng)
+        print(f"{name:<13} {r['max_share']:>9.1f} {r['share_cov']:>9.2f} {r['p50']:>8.0f} {r['p95']:>8.0f}"
+              f" {r['p99']:>8.0f} {r['failure_rate'] * 100:>7.1f} {r['select_us']:>9.1f}")
+
+
+if __name__ == "__main__":
+    run()
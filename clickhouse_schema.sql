@@ -29,6 +29,23 @@ PARTITION BY toYYYYMM(date)
 ORDER BY (user_id, timestamp)
 TTL date + INTERVAL 90 DAY;
 
+-- API events written by the FastAPI workers (analytics.py): proxy_issued,
+-- proxy_allocated, auth_failed
+CREATE TABLE IF NOT EXISTS api_events (
+    event_time DateTime64(3, 'UTC'),
+    event_type LowCardinality(String),
+    user_id UInt32,
+    proxy_id UInt32,
+    proxy_type LowCardinality(String),
+    country LowCardinality(String),
+    endpoint LowCardinality(String),
+    client_ip String,
+    date Date DEFAULT toDate(event_time)
+) ENGINE = MergeTree()
+PARTITION BY toYYYYMM(date)
+ORDER BY (event_type, user_id, event_time)
+TTL date + INTERVAL 90 DAY;
+
 -- Daily aggregated statistics
 CREATE TABLE IF NOT EXISTS daily_stats (
     date Date,
@@ -44,6 +61,13 @@ CREATE TABLE IF NOT EXISTS daily_stats (
 PARTITION BY toYYYYMM(date)
 ORDER BY (date, user_id);
 
+-- Distinct proxies per user (daily_stats.unique_proxies can't be summed across days)
+CREATE TABLE IF NOT EXISTS user_proxies (
+    user_id UInt32,
+    proxies AggregateFunction(uniqExact, UInt32)
+) ENGINE = AggregatingMergeTree()
+ORDER BY user_id;
+
 -- Proxy performance table
 CREATE TABLE IF NOT EXISTS proxy_performance (
     date Date,
@@ -106,6 +130,17 @@ AS SELECT
 FROM request_logs
 GROUP BY date, user_id;
 
+-- Materialized view for distinct proxies per user. Existing request_logs rows
+-- are not picked up; backfill once with:
+--   INSERT INTO user_proxies SELECT user_id, uniqExactState(proxy_id) FROM request_logs GROUP BY user_id;
+CREATE MATERIALIZED VIEW IF NOT EXISTS user_proxies_mv
+TO user_proxies
+AS SELECT
+    user_id,
+    uniqExactState(proxy_id) as proxies
+FROM request_logs
+GROUP BY user_id;
+
 -- Materialized view for proxy performance
 CREATE MATERIALIZED VIEW IF NOT EXISTS proxy_performance_mv
 TO proxy_performance
@@ -205,7 +205,7 @@ class ApiClient {
   }
 
   /**
-   * Release a proxy (stub - not implemented in MVP)
+   * Release an allocated proxy (id from /proxy/allocate or /proxy/list)
    * DELETE /proxy/{id}/release
    */
   async releaseProxy(proxyId) {
@@ -28,7 +28,11 @@ type Config struct {
 	ClickHousePass string
 
 	// Traffic tracking
-	TrafficFlushInterval int // seconds
+	TrafficFlushInterval int // seconds; also the delay of quota enforcement after a connection closes
+
+	// Quota: per-user traffic goes to the API's POST /internal/traffic
+	QuotaIngestURL     string // empty: update subscriptions.data_used_gb directly
+	TrafficIngestToken string
 }
 
 // Load loads configuration from environment variables
@@ -47,7 +51,9 @@ func Load() (*Config, error) {
 		ClickHouseDB:         getEnv("CLICKHOUSE_DB", "proxyflow_analytics"),
 		ClickHouseUser:       getEnv("CLICKHOUSE_USER", "default"),
 		ClickHousePass:       getEnv("CLICKHOUSE_PASS", ""),
-		TrafficFlushInterval: getEnvInt("TRAFFIC_FLUSH_INTERVAL", 60),
+		TrafficFlushInterval: getEnvInt("TRAFFIC_FLUSH_INTERVAL", 10),
+		QuotaIngestURL:       getEnv("QUOTA_INGEST_URL", ""),
+		TrafficIngestToken:   getEnv("TRAFFIC_INGEST_TOKEN", ""),
 	}
 
 	return cfg, nil
@@ -42,7 +42,9 @@ func main() {
 	log.Printf("INFO: Connected to PostgreSQL")
 
 	// Create traffic tracker
-	trafficTracker, err := tracker.NewTracker(dbClient, cfg.ClickHouseDSN(), cfg.TrafficFlushInterval)
+	trafficTracker, err := tracker.NewTracker(
+		dbClient, cfg.ClickHouseDSN(), cfg.TrafficFlushInterval, cfg.QuotaIngestURL, cfg.TrafficIngestToken,
+	)
 	if err != nil {
 		log.Fatalf("FATAL: Failed to create tracker: %v", err)
 	}
@@ -1,10 +1,15 @@
 package tracker
 
 import (
+	"bytes"
 	"context"
+	"crypto/rand"
 	"database/sql"
+	"encoding/hex"
+	"encoding/json"
 	"fmt"
 	"log"
+	"net/http"
 	"sync"
 	"time"
 
@@ -33,10 +38,34 @@ type Tracker struct {
 	clickHouseDB *sql.DB
 	flushTicker  *time.Ticker
 	stopChan     chan struct{}
+
+	// Quota ingestion (FastAPI POST /internal/traffic); empty URL keeps the
+	// per-user UPDATE of subscriptions.data_used_gb instead
+	quotaURL   string
+	quotaToken string
+	httpClient *http.Client
+	reportMu   sync.Mutex
+	unreported map[int]int64 // bytes not in a batch yet
+	inflight   *trafficBatch // sent but not acknowledged; retried as is
+	instanceID string
+	batchSeq   uint64
+}
+
+// trafficEvent is one entry of the /internal/traffic request body
+type trafficEvent struct {
+	UserID int   `json:"user_id"`
+	Bytes  int64 `json:"bytes"`
+}
+
+// trafficBatch is the /internal/traffic request body. The API applies a
+// batch id once, so a retry after a lost response is not counted twice.
+type trafficBatch struct {
+	BatchID string         `json:"batch_id"`
+	Events  []trafficEvent `json:"events"`
 }
 
 // NewTracker creates a new traffic tracker
-func NewTracker(dbClient *db.Client, clickHouseDSN string, flushInterval int) (*Tracker, error) {
+func NewTracker(dbClient *db.Client, clickHouseDSN string, flushInterval int, quotaURL, quotaToken string) (*Tracker, error) {
 	// Connect to ClickHouse
 	chDB, err := sql.Open("clickhouse", clickHouseDSN)
 	if err != nil {
@@ -47,12 +76,22 @@ func NewTracker(dbClient *db.Client, clickHouseDSN string, flushInterval int) (*
 		return nil, fmt.Errorf("failed to ping clickhouse: %w", err)
 	}
 
+	instanceID := make([]byte, 8)
+	if _, err := rand.Read(instanceID); err != nil {
+		return nil, fmt.Errorf("failed to generate tracker instance id: %w", err)
+	}
+
 	tracker := &Tracker{
 		pending:      make([]*ConnectionStats, 0, 1000),
 		dbClient:     dbClient,
 		clickHouseDB: chDB,
 		flushTicker:  time.NewTicker(time.Duration(flushInterval) * time.Second),
 		stopChan:     make(chan struct{}),
+		quotaURL:     quotaURL,
+		quotaToken:   quotaToken,
+		httpClient:   &http.Client{Timeout: 10 * time.Second},
+		unreported:   make(map[int]int64),
+		instanceID:   hex.EncodeToString(instanceID),
 	}
 
 	// Start background flusher
@@ -103,7 +142,14 @@ func (t *Tracker) Flush() error {
 		// Continue to flush PostgreSQL anyway
 	}
 
-	// Update data usage in PostgreSQL
+	// Count data usage against the quota (or update PostgreSQL directly)
+	if t.quotaURL != "" {
+		if err := t.reportQuotaUsage(pending); err != nil {
+			log.Printf("ERROR: Failed to report quota usage: %v", err)
+			return err
+		}
+		return nil
+	}
 	if err := t.updatePostgresUsage(pending); err != nil {
 		log.Printf("ERROR: Failed to update PostgreSQL usage: %v", err)
 		return err
@@ -196,6 +242,71 @@ func (t *Tracker) updatePostgresUsage(stats []*ConnectionStats) error {
 	return nil
 }
 
+// reportQuotaUsage sends per-user byte totals to the API's quota counters.
+// A batch that failed is resent unchanged (same batch id) before anything
+// new; traffic recorded meanwhile goes into the next batch.
+func (t *Tracker) reportQuotaUsage(stats []*ConnectionStats) error {
+	t.reportMu.Lock()
+	defer t.reportMu.Unlock()
+
+	for _, stat := range stats {
+		t.unreported[stat.UserID] += stat.BytesUp + stat.BytesDown
+	}
+
+	for {
+		if t.inflight == nil {
+			t.inflight = t.nextBatch()
+			if t.inflight == nil {
+				return nil
+			}
+		}
+		if err := t.sendBatch(t.inflight); err != nil {
+			return err
+		}
+		log.Printf("INFO: Reported data usage for %d users (batch %s)", len(t.inflight.Events), t.inflight.BatchID)
+		t.inflight = nil
+	}
+}
+
+// nextBatch moves the unreported totals into a new batch (nil if there are none)
+func (t *Tracker) nextBatch() *trafficBatch {
+	events := make([]trafficEvent, 0, len(t.unreported))
+	for userID, bytesUsed := range t.unreported {
+		if bytesUsed > 0 {
+			events = append(events, trafficEvent{UserID: userID, Bytes: bytesUsed})
+		}
+	}
+	t.unreported = make(map[int]int64)
+	if len(events) == 0 {
+		return nil
+	}
+	t.batchSeq++
+	return &trafficBatch{BatchID: fmt.Sprintf("%s:%d", t.instanceID, t.batchSeq), Events: events}
+}
+
+func (t *Tracker) sendBatch(batch *trafficBatch) error {
+	body, err := json.Marshal(batch)
+	if err != nil {
+		return fmt.Errorf("failed to encode traffic events: %w", err)
+	}
+	req, err := http.NewRequest(http.MethodPost, t.quotaURL, bytes.NewReader(body))
+	if err != nil {
+		return fmt.Errorf("failed to build quota request: %w", err)
+	}
+	req.Header.Set("Content-Type", "application/json")
+	req.Header.Set("X-Internal-Token", t.quotaToken)
+
+	resp, err := t.httpClient.Do(req)
+	if err != nil {
+		return fmt.Errorf("failed to send traffic events: %w", err)
+	}
+	defer resp.Body.Close()
+	if resp.StatusCode != http.StatusOK {
+		return fmt.Errorf("quota API returned %s", resp.Status)
+	}
+	return nil
+}
+
 // Close stops the tracker and flushes pending stats
 func (t *Tracker) Close() error {
 	close(t.stopChan)
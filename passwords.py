@@ -0,0 +1,16 @@
+"""
+bcrypt hashing for main.run_password_hash.
+
+The spawn workers of the password hash pool import only this module, not
+main: no app, database engines or Redis clients are built per worker, so
+workers start fast and hold no connections. Keep the imports to bcrypt.
+"""
+import bcrypt
+
+
+def hash_password(password: str) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
@@ -0,0 +1,63 @@
+"""
+Writer side of the proxy_pool:changes stream (see main.py "Proxy pool index").
+
+Every process that changes proxy_pools rows appends their ids after the
+commit: FastAPI, health_checker.py, import_proxies.py and add_proxy.py. The
+Django backoffice mirrors this in backoffice/cache.py because it can't import
+from the repo root; keep the names in sync with it.
+
+An entry is {"id": <proxy_pools.id>} or {"id": "*"} for "reload everything".
+More than PROXY_CHANGES_MAX_IDS ids are collapsed into a single "*": readers
+reload the whole index at that size anyway.
+"""
+import logging
+from typing import Union
+
+import redis
+import redis.asyncio
+
+PROXY_CHANGES_STREAM = "proxy_pool:changes"
+PROXY_CHANGES_MAXLEN = 10000
+PROXY_CHANGES_MAX_IDS = 1000
+
+logger = logging.getLogger("proxyflow.proxy_changes")
+
+
+def _queue(pipe, proxy_ids):
+    ids = proxy_ids if len(proxy_ids) <= PROXY_CHANGES_MAX_IDS else ("*",)
+    for proxy_id in ids:
+        pipe.xadd(PROXY_CHANGES_STREAM, {"id": str(proxy_id)}, maxlen=PROXY_CHANGES_MAXLEN, approximate=True)
+
+
+def _publish_failed(error: redis.RedisError):
+    # Never fail the write over this: workers still pick the change up on
+    # their periodic full reload (PROXY_INDEX_FULL_RELOAD_SECONDS)
+    logger.warning("Proxy change feed publish failed: %s", error)
+
+
+def publish_proxy_changes(client: redis.Redis, *proxy_ids: Union[int, str]) -> bool:
+    """Append changed proxy ids ("*" = reload everything); False if Redis was unavailable"""
+    if not proxy_ids:
+        return True
+    try:
+        pipe = client.pipeline(transaction=False)
+        _queue(pipe, proxy_ids)
+        pipe.execute()
+    except redis.RedisError as e:
+        _publish_failed(e)
+        return False
+    return True
+
+
+async def publish_proxy_changes_async(client: redis.asyncio.Redis, *proxy_ids: Union[int, str]) -> bool:
+    """publish_proxy_changes for a redis.asyncio client"""
+    if not proxy_ids:
+        return True
+    try:
+        pipe = client.pipeline(transaction=False)
+        _queue(pipe, proxy_ids)
+        await pipe.execute()
+    except redis.RedisError as e:
+        _publish_failed(e)
+        return False
+    return True
@@ -0,0 +1,279 @@
+"""
+Proxy selection strategies used by main.ProxyIndex.
+
+A strategy is built once per candidate bucket (proxy type + country) from
+Candidate tuples and then answers select(k) without touching the database.
+Load is tracked locally: it starts at the row's current_users and grows with
+every proxy this strategy hands out, relative to max_users. update() takes a
+new reading for a known candidate in place; building is O(n) (O(n log n) for
+least_loaded and sticky), so callers rebuild off the request path.
+
+    round_robin   rotate through the bucket (previous /proxy/get behaviour)
+    weighted      random, proportional to health (alias table, O(1) per pick)
+    least_loaded  lowest load / capacity first, ties to the healthier proxy (heap)
+    p2c           two health-weighted random picks, keep the less loaded one
+    sticky        consistent-hash ring on a caller key (user id): the same user
+                  keeps getting the same proxies while the bucket is stable
+"""
+import hashlib
+import heapq
+import random
+from bisect import bisect_left
+from collections import deque
+from typing import Dict, Hashable, List, NamedTuple, Optional, Sequence
+
+# Latency (ms) at which a proxy's health weight is halved
+LATENCY_HALF_WEIGHT_MS = 500.0
+# Floor so a proxy with success_rate 0 can still be picked (and re-measured)
+MIN_WEIGHT = 0.01
+
+
+class Candidate(NamedTuple):
+    id: int
+    success_rate: float  # percent
+    latency_ms: Optional[float]
+    current_users: int
+    max_users: int
+
+
+def health_weight(candidate: Candidate) -> float:
+    weight = max(candidate.success_rate or 0.0, 0.0) / 100.0
+    if candidate.latency_ms:
+        weight *= LATENCY_HALF_WEIGHT_MS / (LATENCY_HALF_WEIGHT_MS + candidate.latency_ms)
+    return max(weight, MIN_WEIGHT)
+
+
+class AliasTable:
+    """Vose's alias method: O(n) build, O(1) weighted sample"""
+
+    def __init__(self, weights: Sequence[float]):
+        n = len(weights)
+        total = sum(weights)
+        scaled = [w * n / total for w in weights]
+        self.prob = [0.0] * n
+        self.alias = [0] * n
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        for i in small + large:
+            self.prob[i] = 1.0
+
+    def sample(self, rng: random.Random) -> int:
+        i = rng.randrange(len(self.prob))
+        return i if rng.random() < self.prob[i] else self.alias[i]
+
+
+class SelectionStrategy:
+    name = ""
+
+    def __init__(self, candidates: Sequence[Candidate], rng: Optional[random.Random] = None):
+        self.ids = [c.id for c in candidates]
+        self.positions = {proxy_id: i for i, proxy_id in enumerate(self.ids)}
+        self.capacity = [max(c.max_users or 0, 1) for c in candidates]
+        self.load = [c.current_users or 0 for c in candidates]
+        self.weights = [health_weight(c) for c in candidates]
+        self.rng = rng or random.Random()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def select(self, k: int, key: Optional[Hashable] = None) -> List[int]:
+        """Up to k distinct candidate ids"""
+        k = min(k, len(self.ids))
+        if k <= 0:
+            return []
+        picked = self._pick(k, key)
+        for i in picked:
+            self.load[i] += 1
+        return [self.ids[i] for i in picked]
+
+    def update(self, candidate: Candidate) -> bool:
+        """Apply a new load / health reading for a candidate already in the strategy.
+        Returns True if the strategy should be rebuilt to fully reflect it."""
+        i = self.positions.get(candidate.id)
+        if i is None:
+            return True
+        weight = health_weight(candidate)
+        weight_changed = weight != self.weights[i]
+        self.capacity[i] = max(candidate.max_users or 0, 1)
+        self.load[i] = candidate.current_users or 0
+        self.weights[i] = weight
+        return self._updated(i, weight_changed)
+
+    def _updated(self, i: int, weight_changed: bool) -> bool:
+        return False
+
+    def _pick(self, k: int, key: Optional[Hashable]) -> List[int]:
+        raise NotImplementedError
+
+    def _utilization(self, i: int) -> float:
+        return self.load[i] / self.capacity[i]
+
+    def _fill(self, picked: List[int], chosen: set, k: int) -> List[int]:
+        # Random draws kept colliding (k close to n): top up in index order
+        for i in range(len(self.ids)):
+            if len(picked) >= k:
+                break
+            if i not in chosen:
+                picked.append(i)
+                chosen.add(i)
+        return picked
+
+
+class RoundRobinStrategy(SelectionStrategy):
+    name = "round_robin"
+
+    def __init__(self, candidates, rng=None):
+        super().__init__(candidates, rng)
+        self.order = deque(range(len(self.ids)))
+
+    def _pick(self, k, key):
+        picked = []
+        for _ in range(k):
+            i = self.order.popleft()
+            self.order.append(i)
+            picked.append(i)
+        return picked
+
+
+class WeightedRandomStrategy(SelectionStrategy):
+    name = "weighted"
+
+    def __init__(self, candidates, rng=None):
+        super().__init__(candidates, rng)
+        self.table = AliasTable(self.weights)
+
+    def _updated(self, i, weight_changed):
+        # The alias table keeps sampling the old weights until rebuilt
+        return weight_changed
+
+    def _pick(self, k, key):
+        if k * 2 > len(self.ids):
+            # Efraimidis-Spirakis: weighted sample without replacement in one pass
+            keyed = ((self.rng.random() ** (1.0 / w), i) for i, w in enumerate(self.weights))
+            return [i for _, i in heapq.nlargest(k, keyed)]
+        picked, chosen = [], set()
+        for _ in range(k * 4):
+            i = self.table.sample(self.rng)
+            if i not in chosen:
+                chosen.add(i)
+                picked.append(i)
+                if len(picked) == k:
+                    return picked
+        return self._fill(picked, chosen, k)
+
+
+class LeastLoadedStrategy(SelectionStrategy):
+    name = "least_loaded"
+
+    def __init__(self, candidates, rng=None):
+        super().__init__(candidates, rng)
+        self._heapify()
+
+    def _heapify(self):
+        # Entries carry a version; an update pushes a new entry and older ones are skipped
+        self.version = [0] * len(self.ids)
+        self.heap = [(self._utilization(i), -self.weights[i], 0, i) for i in range(len(self.ids))]
+        heapq.heapify(self.heap)
+
+    def _push(self, i: int, utilization: float):
+        self.version[i] += 1
+        heapq.heappush(self.heap, (utilization, -self.weights[i], self.version[i], i))
+
+    def _updated(self, i, weight_changed):
+        self._push(i, self._utilization(i))
+        if len(self.heap) > 4 * len(self.ids):
+            self._heapify()
+        return False
+
+    def _pick(self, k, key):
+        picked = []
+        while len(picked) < k:
+            _utilization, _weight, version, i = heapq.heappop(self.heap)
+            if version == self.version[i]:
+                picked.append(i)
+        for i in picked:
+            self._push(i, (self.load[i] + 1) / self.capacity[i])
+        return picked
+
+
+class PowerOfTwoStrategy(SelectionStrategy):
+    name = "p2c"
+
+    def __init__(self, candidates, rng=None):
+        super().__init__(candidates, rng)
+        self.table = AliasTable(self.weights)
+
+    def _updated(self, i, weight_changed):
+        # Loads are compared live; only the sampling weights need the rebuild
+        return weight_changed
+
+    def _pick(self, k, key):
+        if len(self.ids) == 1:
+            return [0]
+        picked, chosen = [], set()
+        for _ in range(k * 4):
+            a, b = self.table.sample(self.rng), self.table.sample(self.rng)
+            i = a if self._utilization(a) <= self._utilization(b) else b
+            if i not in chosen:
+                chosen.add(i)
+                picked.append(i)
+                # Count it now so the next draw in this request sees the new load
+                self.load[i] += 1
+                if len(picked) == k:
+                    break
+        for i in picked:
+            self.load[i] -= 1  # select() adds it back
+        return self._fill(picked, chosen, k)
+
+
+class StickyHashStrategy(SelectionStrategy):
+    name = "sticky"
+    VNODES = 40
+
+    def __init__(self, candidates, rng=None):
+        super().__init__(candidates, rng)
+        points = sorted(
+            (self._hash(f"{proxy_id}:{v}"), i)
+            for i, proxy_id in enumerate(self.ids)
+            for v in range(self.VNODES)
+        )
+        self.ring_hashes = [h for h, _ in points]
+        self.ring_owners = [i for _, i in points]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+    def _pick(self, k, key):
+        if key is None:
+            key = self.rng.random()
+        position = bisect_left(self.ring_hashes, self._hash(str(key)))
+        picked, chosen = [], set()
+        ring_size = len(self.ring_owners)
+        for step in range(ring_size):
+            i = self.ring_owners[(position + step) % ring_size]
+            if i not in chosen:
+                chosen.add(i)
+                picked.append(i)
+                if len(picked) == k:
+                    break
+        return picked
+
+
+STRATEGIES: Dict[str, type] = {
+    cls.name: cls
+    for cls in (RoundRobinStrategy, WeightedRandomStrategy, LeastLoadedStrategy, PowerOfTwoStrategy, StickyHashStrategy)
+}
+
+
+def build_strategy(name: str, candidates: Sequence[Candidate], rng: Optional[random.Random] = None) -> SelectionStrategy:
+    try:
+        return STRATEGIES[name](candidates, rng)
+    except KeyError:
+        raise ValueError(f"Unknown proxy selection strategy {name!r}; expected one of {sorted(STRATEGIES)}")
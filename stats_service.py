@@ -0,0 +1,181 @@
+"""
+ClickHouse-backed usage statistics for /user/stats and /user/stats/range.
+
+Totals and day/month buckets come from daily_stats (SummingMergeTree, so rows
+of the same (date, user_id) are merged with sum() at query time), hour buckets
+from request_logs (kept 90 days) and distinct proxies from user_proxies.
+All three are filled by materialized views over the gateway's request_logs,
+see clickhouse_schema.sql.
+
+Every query raises ClickHouseUnavailable when the server cannot be reached;
+callers fall back to Postgres, which counts proxies issued by /proxy/get
+rather than gateway traffic, and say so in the response's `source`. After a
+failure ClickHouse is skipped for CLICKHOUSE_RETRY_SECONDS so a dead server
+costs one connect timeout, not one per request.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from clickhouse_driver import Client
+from clickhouse_driver.errors import Error as ClickHouseError
+
+CLICKHOUSE_HOST = os.getenv("CLICKHOUSE_HOST", "clickhouse")
+CLICKHOUSE_PORT = int(os.getenv("CLICKHOUSE_PORT", "9000"))
+CLICKHOUSE_DB = os.getenv("CLICKHOUSE_DB", "proxyflow_analytics")
+CLICKHOUSE_USER = os.getenv("CLICKHOUSE_USER", "default")
+CLICKHOUSE_PASS = os.getenv("CLICKHOUSE_PASS", "")
+CLICKHOUSE_CONNECT_TIMEOUT_SECONDS = float(os.getenv("CLICKHOUSE_CONNECT_TIMEOUT_SECONDS", "2"))
+CLICKHOUSE_QUERY_TIMEOUT_SECONDS = float(os.getenv("CLICKHOUSE_QUERY_TIMEOUT_SECONDS", "5"))
+CLICKHOUSE_RETRY_SECONDS = float(os.getenv("CLICKHOUSE_RETRY_SECONDS", "30"))
+
+# (bucket start, total_requests, successful_requests, data_used_mb)
+StatsRow = Tuple[datetime, int, int, float]
+
+logger = logging.getLogger("proxyflow")
+
+
+class ClickHouseUnavailable(Exception):
+    pass
+
+
+# clickhouse_driver.Client is one connection and not thread-safe: one per threadpool thread
+_local = threading.local()
+_down_until = 0.0
+
+
+def new_client(send_receive_timeout: float = CLICKHOUSE_QUERY_TIMEOUT_SECONDS) -> Client:
+    """Connects lazily, on the first execute()"""
+    return Client(
+        host=CLICKHOUSE_HOST,
+        port=CLICKHOUSE_PORT,
+        database=CLICKHOUSE_DB,
+        user=CLICKHOUSE_USER,
+        password=CLICKHOUSE_PASS,
+        connect_timeout=CLICKHOUSE_CONNECT_TIMEOUT_SECONDS,
+        send_receive_timeout=send_receive_timeout,
+        settings={"max_execution_time": send_receive_timeout},
+    )
+
+
+def _client() -> Client:
+    client = getattr(_local, "client", None)
+    if client is None:
+        client = _local.client = new_client()
+    return client
+
+
+def _execute(query: str, params: dict) -> list:
+    global _down_until
+    if time.monotonic() < _down_until:
+        raise ClickHouseUnavailable("skipped after a recent failure")
+    try:
+        return _client().execute(query, params)
+    except (ClickHouseError, OSError, EOFError) as e:
+        _down_until = time.monotonic() + CLICKHOUSE_RETRY_SECONDS
+        logger.warning("ClickHouse stats query failed, using Postgres for %ss: %s", CLICKHOUSE_RETRY_SECONDS, e)
+        _local.client = None
+        raise ClickHouseUnavailable(str(e)) from e
+
+
+def as_utc(value) -> datetime:
+    """ClickHouse and Postgres hand back dates, naive and aware datetimes; all buckets are UTC datetimes"""
+    if not isinstance(value, datetime):
+        return datetime(value.year, value.month, value.day, tzinfo=timezone.utc)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def truncate_to_bucket(value: datetime, granularity: str) -> datetime:
+    value = as_utc(value)
+    if granularity == "hour":
+        return value.replace(minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        return value.replace(hour=0, minute=0, second=0, microsecond=0)
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_bucket(value: datetime, granularity: str) -> datetime:
+    if granularity == "hour":
+        return value + timedelta(hours=1)
+    if granularity == "day":
+        return value + timedelta(days=1)
+    if value.month == 12:
+        return value.replace(year=value.year + 1, month=1)
+    return value.replace(month=value.month + 1)
+
+
+def bucket_starts(start: datetime, end: datetime, granularity: str, limit: Optional[int] = None) -> List[datetime]:
+    """Starts of the buckets covering [start, end); start is rounded down. Stops after limit + 1"""
+    buckets = []
+    current = truncate_to_bucket(start, granularity)
+    end = as_utc(end)
+    while current < end:
+        buckets.append(current)
+        if limit is not None and len(buckets) > limit:
+            break
+        current = next_bucket(current, granularity)
+    return buckets
+
+
+def user_totals(user_id: int, day_starts: Sequence[datetime]) -> tuple:
+    """(total, successful, data_mb, unique_proxies, *requests per day in day_starts) in one round trip"""
+    params: Dict[str, object] = {"user_id": user_id}
+    per_day = []
+    for i, day_start in enumerate(day_starts):
+        params[f"day{i}"] = day_start.date()
+        per_day.append(f"sumIf(total_requests, date = %(day{i})s)")
+    (row,) = _execute(f"""
+        SELECT
+            sum(total_requests),
+            sum(successful_requests),
+            sum(total_data_mb),
+            (SELECT uniqExactMerge(proxies) FROM user_proxies WHERE user_id = %(user_id)s),
+            {", ".join(per_day)}
+        FROM daily_stats
+        WHERE user_id = %(user_id)s
+    """, params)
+    return row
+
+
+def user_range(user_id: int, start: datetime, until: datetime, granularity: str) -> List[StatsRow]:
+    """Non-empty buckets in [start, until); start and until must be bucket boundaries"""
+    params = {"user_id": user_id, "start": start, "until": until}
+    if granularity == "hour":
+        rows = _execute("""
+            SELECT
+                toUnixTimestamp(toStartOfHour(timestamp)) AS bucket,
+                count(),
+                countIf(success = 1),
+                sum(data_used_mb)
+            FROM request_logs
+            WHERE user_id = %(user_id)s AND timestamp >= %(start)s AND timestamp < %(until)s
+            GROUP BY bucket
+            ORDER BY bucket
+        """, params)
+        return [
+            (datetime.fromtimestamp(bucket, timezone.utc), int(total), int(successful), float(data_mb))
+            for bucket, total, successful, data_mb in rows
+        ]
+
+    params["start"], params["until"] = start.date(), until.date()
+    bucket_expr = "date" if granularity == "day" else "toStartOfMonth(date)"
+    rows = _execute(f"""
+        SELECT
+            {bucket_expr} AS bucket,
+            sum(total_requests),
+            sum(successful_requests),
+            sum(total_data_mb)
+        FROM daily_stats
+        WHERE user_id = %(user_id)s AND date >= %(start)s AND date < %(until)s
+        GROUP BY bucket
+        ORDER BY bucket
+    """, params)
+    return [
+        (as_utc(bucket), int(total), int(successful), float(data_mb))
+        for bucket, total, successful, data_mb in rows
+    ]